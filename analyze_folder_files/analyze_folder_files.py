@@ -5,140 +5,996 @@ analyze_folder_files.py
 This script recursively processes all files in a given folder.
 For each file, it reads the contents and sends them along with a system prompt
 to the Gemini LLM (model "gemini-2.0-flash-thinking-exp-01-21") for analysis (grammar checking and XML/Markdown validation).
-The responses are aggregated into a single timestamped output file with clear separators.
-Note: The script excludes the .git folder, .gitignore file, and any files/patterns listed in .gitignore from processing.
+The responses are appended to a single timestamped output file with clear separators as soon as
+they complete, and a manifest of finished files allows an interrupted run to be resumed (--resume).
+Note: The script excludes the .git folder, .gitignore files, and any files/patterns listed in .gitignore files
+(including nested ones) from processing.
+Files can be analyzed concurrently (--concurrency), with requests and tokens per minute limited by a
+token bucket and failed requests (429/5xx) retried with exponential backoff.
+Responses are cached in SQLite by file content, model and system prompt, so unchanged files are not sent again.
+Binary files are skipped after reading their header, large files are split into chunks that fit a token budget,
+and small files are packed into shared prompts whose responses are split back out per file.
+Every request is timed and its token usage recorded, and a latency and throughput summary is printed at the end.
+For batch processing, --plan writes the requests to a JSONL job file instead of sending them, and --ingest
+turns the batch backend's results back into the usual report.
 """
 
 import os
+import sys
+import time
+import random
+import re
+import csv
+import glob
+import json
+import math
+import heapq
+import sqlite3
+import codecs
+import hashlib
 import argparse
 import datetime
-from google import genai
-from google.genai import types
-import pathspec
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-def get_gitignore_patterns(folder_path):
+# The shared directory walker lives in the repository's shared folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'shared'))
+from gitignore_walker import iter_files
+
+# Model every file is sent to.
+MODEL_NAME = 'gemini-2.0-flash-thinking-exp-01-21'
+
+# The system prompt instructing the LLM.
+SYSTEM_PROMPT = (
+    "You are an expert language editor. Please analyze the following text carefully for any grammar errors. "
+    "Additionally, if the text is in XML or Markdown format, check that the structure and formatting are correct. "
+    "Consider if any changes are needed at all and provide detailed suggestions for improvements or confirm that no changes are needed."
+)
+
+# Retries of a request failing with 429 or 5xx before the file is given up on.
+DEFAULT_MAX_RETRIES = 5
+# Backoff before the first retry, doubled on every further retry up to MAX_BACKOFF (seconds).
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+# Default response cache, in the current directory like the output files.
+DEFAULT_CACHE_FILE = 'analysis_cache.sqlite'
+# Separator written after each file's analysis in the output.
+SEPARATOR = "\n" + "=" * 30 + "\n"
+# Suffix of the manifest of finished files kept next to the output file.
+MANIFEST_SUFFIX = '.manifest'
+# Rough number of characters per token, used for rate limiting and to size chunks and packs.
+CHARS_PER_TOKEN = 4
+# Bytes read from the start of a file to decide whether it is binary.
+SNIFF_SIZE = 8192
+# Files with a larger prompt than this are split into chunks of this size (tokens).
+DEFAULT_MAX_PROMPT_TOKENS = 30000
+# Size of the prompts small files are packed into (tokens), files up to a quarter of it are packed.
+DEFAULT_PACK_TOKENS = 8000
+# Maximum number of files packed into one prompt.
+MAX_PACK_FILES = 20
+# Counters of a job filled in by run_job().
+JOB_COUNTERS = ('model_s', 'limiter_s', 'backoff_s', 'requests', 'retries', 'prompt_chars', 'response_chars',
+                'prompt_tokens', 'response_tokens', 'total_tokens')
+# Counters of a job holding seconds rather than counts.
+JOB_TIMERS = ('model_s', 'limiter_s', 'backoff_s')
+# Suffix of the index of jobs kept next to a job file written by --plan.
+INDEX_SUFFIX = '.index'
+# Number of slowest requests listed in the run summary.
+SLOWEST_REQUESTS = 5
+# Header starting each file in a packed prompt, and each file's section in the response.
+PACK_HEADER = "=== FILE: {path} ==="
+PACK_HEADER_PATTERN = re.compile(r"^[ \t*#]*=== FILE: (.+?) ===[ \t*]*$", re.MULTILINE)
+# Instructions appended to packed prompts so the response can be split per file.
+PACK_INSTRUCTIONS = (
+    "The text above contains {count} separate files, each starting with a header line of the form "
+    "\"=== FILE: <path> ===\". Analyze each file separately. Start the analysis of each file with its "
+    "header line exactly as given, on a line of its own, and do not write anything before the first header."
+)
+
+class RateLimiter:
+    """
+    Token-bucket limiter for requests per minute and tokens per minute, shared by all worker threads.
+
+    Each bucket holds at most one minute of its budget and refills continuously, so short bursts
+    are allowed while the average rate stays under the limit.
+
+    Parameters:
+    - requests_per_minute (int): Maximum requests per minute, or None for no limit.
+    - tokens_per_minute (int): Maximum prompt tokens per minute, or None for no limit.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.lock = threading.Lock()
+        # Bucket name -> [capacity, available, refill per second]
+        self.buckets = {}
+        if requests_per_minute:
+            self.buckets['requests'] = [requests_per_minute, requests_per_minute, requests_per_minute / 60]
+        if tokens_per_minute:
+            self.buckets['tokens'] = [tokens_per_minute, tokens_per_minute, tokens_per_minute / 60]
+        self.updated = time.monotonic()
+
+    def acquire(self, tokens=0):
+        """Blocks until one request of the given number of tokens fits in every bucket, then takes it."""
+        # A cost larger than a whole bucket would never fit, it waits for a full bucket instead
+        costs = {name: min(bucket[0], 1 if name == 'requests' else tokens) for name, bucket in self.buckets.items()}
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                elapsed = now - self.updated
+                self.updated = now
+                wait = 0.0
+                for name, bucket in self.buckets.items():
+                    capacity, available, rate = bucket
+                    bucket[1] = min(capacity, available + elapsed * rate)
+                    if bucket[1] < costs[name]:
+                        wait = max(wait, (costs[name] - bucket[1]) / rate)
+                if wait == 0.0:
+                    for name, bucket in self.buckets.items():
+                        bucket[1] -= costs[name]
+                    return
+            time.sleep(wait)
+
+class ResponseCache:
     """
-    Reads .gitignore file and returns a PathSpec object for pattern matching.
-    Returns None if no .gitignore exists.
+    Persistent SQLite cache of model responses, shared by all worker threads.
+
+    Responses are keyed by a hash of the file content, the model name and the system prompt, so a
+    cached response is only reused for the same content sent to the same model with the same
+    instructions. Each entry records when it was created and last used for eviction. Uses are only
+    written to the database by evict() and close(), in one transaction, so cache hits cost no commits.
+
+    Parameters:
+    - path (str): Path of the SQLite database, created if it does not exist.
     """
-    gitignore_path = os.path.join(folder_path, '.gitignore')
-    if os.path.exists(gitignore_path):
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER, created REAL, last_used REAL)"
+        )
+        self.connection.commit()
+        self.used = {}  # key -> time of the last use not yet written to the database
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns the cached response for key and marks it as used, or None if there is none."""
+        with self.lock:
+            row = self.connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.used[key] = time.time()
+            return row[0]
+
+    def put(self, key, response):
+        """Stores response under key, replacing any previous entry."""
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, MODEL_NAME, response, len(response.encode('utf-8')), now, now),
+            )
+            self.connection.commit()
+
+    def write_used(self):
+        """Writes the pending last used times to the database, without committing. Call with the lock held."""
+        self.connection.executemany(
+            "UPDATE responses SET last_used = ? WHERE key = ?", [(used, key) for key, used in self.used.items()]
+        )
+        self.used = {}
+
+    def evict(self, max_age_days=None, max_size_mb=None):
+        """
+        Writes the pending last used times, then removes entries not used for more than max_age_days
+        and the least recently used entries until the cached responses take at most max_size_mb.
+        Returns the number of entries removed.
+        """
+        removed = 0
+        with self.lock:
+            self.write_used()
+            if max_age_days is not None:
+                cutoff = time.time() - max_age_days * 86400
+                removed += self.connection.execute("DELETE FROM responses WHERE last_used < ?", (cutoff,)).rowcount
+            if max_size_mb is not None:
+                excess = (self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                          - max_size_mb * 1024 * 1024)
+                keys = []
+                for key, size in self.connection.execute("SELECT key, size FROM responses ORDER BY last_used"):
+                    if excess <= 0:
+                        break
+                    keys.append((key,))
+                    excess -= size
+                removed += len(keys)
+                self.connection.executemany("DELETE FROM responses WHERE key = ?", keys)
+            self.connection.commit()
+            if removed:
+                self.connection.execute("VACUUM")
+        return removed
+
+    def close(self):
+        with self.lock:
+            self.write_used()
+            self.connection.commit()
+            self.connection.close()
+
+def cache_key(content):
+    """Returns the cache key of a file content: a hash of the content, the model name and the system prompt."""
+    digest = hashlib.sha256()
+    for part in (MODEL_NAME, SYSTEM_PROMPT, content):
+        digest.update(hashlib.sha256(part.encode('utf-8')).digest())
+    return digest.hexdigest()
+
+def estimate_tokens(text):
+    """Returns a rough token count of text, good enough for rate limiting."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def is_retryable(error):
+    """Returns True if error is a rate limit (429), a server error (5xx) or a connection problem."""
+    code = getattr(error, 'code', None)
+    if not isinstance(code, int):
+        code = getattr(error, 'status_code', None)
+    if isinstance(code, int):
+        return code == 429 or 500 <= code < 600
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+def generate_with_retries(client, prompt, limiter=None, max_retries=DEFAULT_MAX_RETRIES, stats=None):
+    """
+    Sends prompt to the model and returns the response.
+
+    Requests failing with a retryable error are retried up to max_retries times after an
+    exponential backoff with full jitter, so many workers hitting a rate limit at once do not
+    retry in lockstep. Other errors, and the last retryable one, are raised.
+
+    Parameters:
+    - client: The genai client, or any object with the same client.models.generate_content call.
+    - prompt (str): The prompt to send.
+    - limiter (RateLimiter): Limiter each attempt is charged against, or None.
+    - max_retries (int): Maximum number of retries.
+    - stats (dict): Job dict whose 'retries' count is increased on every retry, whose 'model_s',
+      'limiter_s' and 'backoff_s' add up the time spent in model calls, waiting for the limiter and
+      backing off, and whose 'latencies' list gets the duration of every model call, or None.
+    """
+    tokens = estimate_tokens(prompt)
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            start = time.perf_counter()
+            limiter.acquire(tokens)
+            if stats is not None:
+                stats['limiter_s'] += time.perf_counter() - start
+        start = time.perf_counter()
         try:
-            with open(gitignore_path, 'r', encoding='utf-8') as f:
-                gitignore = pathspec.PathSpec.from_lines('gitwildmatch', f)
-                return gitignore
+            response, error = client.models.generate_content(model=MODEL_NAME, contents=prompt), None
         except Exception as e:
-            print(f"Error reading .gitignore file: {e}")
-    return None
+            response, error = None, e
+        if stats is not None:
+            # Only the model call itself, without the limiter wait and the backoff
+            latency = time.perf_counter() - start
+            stats['model_s'] += latency
+            stats['latencies'].append(latency)
+        if error is None:
+            return response
+        if attempt == max_retries or not is_retryable(error):
+            raise error
+        delay = random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt))
+        print(f"Retrying in {delay:.1f} s after error: {error}")
+        if stats is not None:
+            stats['retries'] += 1
+            stats['backoff_s'] += delay
+        time.sleep(delay)
 
-def analyze_file(file_path, client):
+def usage_tokens(response):
+    """Returns the (prompt, response, total) token counts from a response's usage metadata, 0 when not reported."""
+    usage = getattr(response, 'usage_metadata', None)
+    return tuple(getattr(usage, name, None) or 0
+                 for name in ('prompt_token_count', 'candidates_token_count', 'total_token_count'))
+
+def read_text_file(file_path):
     """
-    Reads the file content and calls the Gemini LLM for analysis.
-    Returns the LLM's response text (or None on error).
+    Returns the content of a UTF-8 text file, or None for binary and unreadable files.
+    Only the first SNIFF_SIZE bytes are read before a binary file is skipped.
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        with open(file_path, 'rb') as f:
+            head = f.read(SNIFF_SIZE)
+            # NUL bytes do not occur in text, and a header that is not UTF-8 means the file is not either
+            try:
+                codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+            except UnicodeDecodeError:
+                head = b'\0'
+            if b'\0' in head:
+                print(f"Skipping binary file: {file_path}")
+                return None
+            data = head + f.read()
+        return data.decode('utf-8')
     except Exception as e:
         print(f"Error reading file {file_path}: {e}")
         return None
 
-    # Define the system prompt to instruct the LLM.
-    system_prompt = (
-        "You are an expert language editor. Please analyze the following text carefully for any grammar errors. "
-        "Additionally, if the text is in XML or Markdown format, check that the structure and formatting are correct. "
-        "Consider if any changes are needed at all and provide detailed suggestions for improvements or confirm that no changes are needed."
-    )
-    
+def build_prompt(file_path, content, part=None, parts=None):
+    """Returns the prompt for one file, or for one part of a file split into chunks."""
+    label = file_path if part is None else f"{file_path} (part {part} of {parts})"
     # Create the prompt by combining file information, content, and instructions.
-    prompt = f"File: {file_path}\n\nContent:\n{content}\n\n{system_prompt}"
-    
-    try:
-        response = client.models.generate_content(
-            model='gemini-2.0-flash-thinking-exp-01-21',
-            contents=prompt
-        )
+    return f"File: {label}\n\nContent:\n{content}\n\n{SYSTEM_PROMPT}"
+
+def build_pack_prompt(files):
+    """Returns one prompt analyzing several small files, given as (file_path, content) tuples."""
+    sections = [f"{PACK_HEADER.format(path=file_path)}\n{content}" for file_path, content in files]
+    return "\n\n".join(sections) + f"\n\n{SYSTEM_PROMPT}\n\n" + PACK_INSTRUCTIONS.format(count=len(files))
+
+def split_pack_response(text, paths):
+    """
+    Splits the response to a packed prompt at the file headers the model repeated.
+    Returns a dict of file path -> analysis for the paths whose header was found.
+    """
+    analyses = {}
+    matches = list(PACK_HEADER_PATTERN.finditer(text))
+    for index, match in enumerate(matches):
+        path = match.group(1).strip()
+        if path in paths and path not in analyses:
+            end = matches[index + 1].start() if index + 1 < len(matches) else len(text)
+            analyses[path] = text[match.end():end].strip()
+    return analyses
+
+def split_into_chunks(content, max_chars):
+    """Splits content at line boundaries into chunks of at most max_chars characters."""
+    chunks = []
+    current = []
+    size = 0
+    for line in content.splitlines(keepends=True):
+        # A single line longer than a chunk is split in the middle
+        while len(line) > max_chars:
+            if current:
+                chunks.append(''.join(current))
+                current, size = [], 0
+            chunks.append(line[:max_chars])
+            line = line[max_chars:]
+        if size + len(line) > max_chars:
+            chunks.append(''.join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line)
+    if current:
+        chunks.append(''.join(current))
+    return chunks
+
+def new_job(kind, files, prompts, read_s=0.0, prompt_s=0.0):
+    """
+    Returns a job dict of the given kind with zeroed counters, which run_job() fills in with the
+    time spent in model calls, waiting for the limiter and backing off, the duration of every model
+    call, the number of requests and retries and the sizes and token usage.
+    """
+    job = {'kind': kind, 'files': files, 'prompts': prompts, 'read_s': read_s, 'prompt_s': prompt_s}
+    job.update(dict.fromkeys(JOB_COUNTERS, 0))
+    job.update(dict.fromkeys(JOB_TIMERS, 0.0))
+    job['latencies'] = []
+    return job
+
+def iter_jobs(folder_path, skip=(), cache=None, refresh=False, max_prompt_tokens=DEFAULT_MAX_PROMPT_TOKENS,
+              pack_tokens=DEFAULT_PACK_TOKENS):
+    """
+    Plans the requests needed to analyze the files of a folder and yields them as job dicts with:
+    - kind: 'cached' (answered from the cache), 'file', 'chunks' (one file split into several
+      prompts) or 'pack' (several small files in one prompt)
+    - files: list of (file_path, cache key) tuples
+    - prompts: list of prompts to send, or the cached analysis for 'cached' jobs
+    - read_s, prompt_s: seconds spent reading the files and building the prompts
+
+    Binary files are skipped after reading their header. Files over max_prompt_tokens are split
+    into chunks, and files up to a quarter of pack_tokens are packed together into prompts of up
+    to pack_tokens tokens (pack_tokens 0 disables packing).
+    """
+    max_chars = max_prompt_tokens * CHARS_PER_TOKEN
+    pack_chars = pack_tokens * CHARS_PER_TOKEN
+    pack = []
+    pack_size = 0
+
+    def flush_pack():
+        nonlocal pack, pack_size
+        start = time.perf_counter()
+        if len(pack) == 1:
+            (file_path, key, content, read_s), = pack
+            kind, prompts = 'file', [build_prompt(file_path, content)]
+        else:
+            kind, prompts = 'pack', [build_pack_prompt([(file_path, content) for file_path, _, content, _ in pack])]
+        job = new_job(kind, [(file_path, key) for file_path, key, _, _ in pack], prompts,
+                      sum(read_s for _, _, _, read_s in pack), time.perf_counter() - start)
+        pack, pack_size = [], 0
+        return job
+
+    # Ignored directories are pruned by the walker before they are listed
+    for file_path in iter_files(folder_path):
+        if os.path.abspath(file_path) in skip:
+            continue
+        start = time.perf_counter()
+        content = read_text_file(file_path)
+        if content is None:
+            continue
+        key = cache_key(content)
+        read_s = time.perf_counter() - start
+        if cache is not None and not refresh:
+            cached = cache.get(key)
+            if cached is not None:
+                yield new_job('cached', [(file_path, key)], [cached], read_s)
+                continue
+
+        size = len(file_path) + len(content)
+        if size <= pack_chars // 4:
+            if pack and (pack_size + size > pack_chars or len(pack) >= MAX_PACK_FILES):
+                yield flush_pack()
+            pack.append((file_path, key, content, read_s))
+            pack_size += size
+        elif len(content) + len(SYSTEM_PROMPT) > max_chars:
+            start = time.perf_counter()
+            # Room is left in every chunk for the file name and the instructions
+            chunks = split_into_chunks(content, max(1, max_chars - len(SYSTEM_PROMPT) - len(file_path) - 100))
+            prompts = [build_prompt(file_path, chunk, part, len(chunks)) for part, chunk in enumerate(chunks, start=1)]
+            yield new_job('chunks', [(file_path, key)], prompts, read_s, time.perf_counter() - start)
+        else:
+            start = time.perf_counter()
+            prompt = build_prompt(file_path, content)
+            yield new_job('file', [(file_path, key)], [prompt], read_s, time.perf_counter() - start)
+    if pack:
+        yield flush_pack()
+
+def run_job(job, client, limiter=None, max_retries=DEFAULT_MAX_RETRIES):
+    """
+    Sends the prompts of a job to the LLM and returns a list of (file_path, cache key, analysis) tuples,
+    with None as the analysis of the files that failed.
+
+    The responses are assembled by assemble_results(), and the files whose section is missing from
+    the response to a pack are sent again one by one. The time, retries, sizes and token usage of the requests are added to the job's counters,
+    and the duration of every model call to its latencies.
+    """
+    def send(prompt):
+        try:
+            response = generate_with_retries(client, prompt, limiter, max_retries, job)
+        finally:
+            job['requests'] += 1
+            job['prompt_chars'] += len(prompt)
+        text = response.text or ""
+        job['response_chars'] += len(text)
+        for name, tokens in zip(('prompt_tokens', 'response_tokens', 'total_tokens'), usage_tokens(response)):
+            job[name] += tokens
         return response.text
+
+    paths = [file_path for file_path, _ in job['files']]
+    if job['kind'] == 'pack':
+        print(f"Processing {len(paths)} packed files: {', '.join(paths)}")
+    elif job['kind'] == 'chunks':
+        print(f"Processing file: {paths[0]} ({len(job['prompts'])} parts)")
+    else:
+        print(f"Processing file: {paths[0]}")
+    try:
+        responses = [send(prompt) for prompt in job['prompts']]
     except Exception as e:
-        print(f"Error processing file {file_path} with LLM: {e}")
-        return None
+        print(f"Error processing {', '.join(paths)} with LLM: {e}")
+        return [(file_path, key, None) for file_path, key in job['files']]
 
-def process_folder(folder_path, client):
+    results = []
+    for file_path, key, analysis in assemble_results(job, responses):
+        if analysis is None and job['kind'] == 'pack':
+            print(f"Packed response has no section for {file_path}, sending it alone")
+            content = read_text_file(file_path)
+            if content is not None:
+                single = new_job('file', [(file_path, key)], [build_prompt(file_path, content)])
+                results.extend(run_job(single, client, limiter, max_retries))
+                for name in JOB_COUNTERS:
+                    job[name] += single[name]
+                job['latencies'] += single['latencies']
+                continue
+        results.append((file_path, key, analysis))
+    return results
+
+def assemble_results(job, responses):
+    """
+    Turns the response texts to a job's prompts into a list of (file_path, cache key, analysis) tuples.
+    The responses to the chunks of a file are stitched together in order, and the response to a pack
+    is split per file, with None as the analysis of the files whose section is missing.
+    """
+    if job['kind'] == 'file':
+        return [(*job['files'][0], responses[0])]
+    if job['kind'] == 'chunks':
+        parts = len(responses)
+        stitched = "\n\n".join(f"Part {part} of {parts}:\n{response}" for part, response in enumerate(responses, start=1))
+        return [(*job['files'][0], stitched)]
+    analyses = split_pack_response(responses[0] or "", {file_path for file_path, _ in job['files']})
+    return [(file_path, key, analyses.get(file_path)) for file_path, key in job['files']]
+
+def record_results(job, results, cache=None, emit=None, metrics=None):
+    """
+    Records the results of a finished job: adds it to the metrics, stores new analyses in the cache
+    and passes each analysis to emit(file_path, analysis). Returns the number of files analyzed.
+    """
+    if metrics is not None:
+        metrics.add(job, results)
+    processed = 0
+    for file_path, key, analysis in results:
+        if analysis is None:
+            continue
+        processed += 1
+        if cache is not None and job['kind'] != 'cached':
+            cache.put(key, analysis)
+        if emit is not None:
+            emit(file_path, analysis)
+    return processed
+
+def process_folder(folder_path, client, concurrency=1, limiter=None, max_retries=DEFAULT_MAX_RETRIES,
+                   cache=None, refresh=False, emit=None, skip=(), max_prompt_tokens=DEFAULT_MAX_PROMPT_TOKENS,
+                   pack_tokens=DEFAULT_PACK_TOKENS, metrics=None):
     """
     Recursively walks through the folder and processes every file,
-    excluding the .git folder, .gitignore file, and files matching .gitignore patterns.
-    Returns a list of tuples: (file_path, analysis_result).
+    excluding the .git folder, .gitignore files, and files matching .gitignore patterns.
+    Each result is passed to emit(file_path, analysis_result) as soon as it completes, so results
+    are not kept in memory. Returns the number of files analyzed.
+
+    Parameters:
+    - folder_path (str): Folder to analyze.
+    - client: The genai client, or a stand-in such as stub_client.StubClient.
+    - concurrency (int): Number of requests in flight at the same time.
+    - limiter (RateLimiter): Limiter shared by all requests, or None.
+    - max_retries (int): Retries of a request failing with 429 or 5xx.
+    - cache (ResponseCache): Cache of responses by file content, or None.
+    - refresh (bool): Call the LLM even for cached files, replacing their cached responses.
+    - emit (callable): Called in the calling thread with each file path and its analysis, or None.
+    - skip (set): Absolute paths of files finished in an earlier run, which are not analyzed again.
+    - max_prompt_tokens (int): Files larger than this are split into chunks of this size.
+    - pack_tokens (int): Size of the prompts small files are packed into, 0 to send every file alone.
+    - metrics (RunMetrics): Collects the timings and token usage of every job, or None.
     """
-    results = []
-    gitignore = get_gitignore_patterns(folder_path)
-    
-    for root, dirs, files in os.walk(folder_path):
-        # Exclude the .git directory from recursion
-        if ".git" in dirs:
-            dirs.remove(".git")
-            
-        # Remove directories that match gitignore patterns
-        if gitignore:
-            dirs[:] = [d for d in dirs if not gitignore.match_file(os.path.relpath(os.path.join(root, d), folder_path))]
-            
-        for file in files:
-            # Skip .gitignore file
-            if file == ".gitignore":
+    def collect(done):
+        nonlocal processed
+        for future in done:
+            processed += record_results(pending.pop(future), future.result(), cache, emit, metrics)
+
+    processed = 0
+    pending = {}
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    try:
+        for job in iter_jobs(folder_path, skip, cache, refresh, max_prompt_tokens, pack_tokens):
+            if job['kind'] == 'cached':
+                (file_path, key), = job['files']
+                processed += record_results(job, [(file_path, key, job['prompts'][0])], cache, emit, metrics)
+                continue
+            # Only a few jobs are queued ahead of the workers, so the walk and memory stay bounded
+            if len(pending) >= 2 * max(1, concurrency):
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending[executor.submit(run_job, job, client, limiter, max_retries)] = job
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+    finally:
+        # On Ctrl-C, queued jobs are dropped and only the requests already running are waited for
+        executor.shutdown(wait=True, cancel_futures=True)
+    return processed
+
+def job_id(job):
+    """Returns a stable ID of a job, derived from its kind and the paths and content hashes of its files."""
+    digest = hashlib.sha256(job['kind'].encode('utf-8'))
+    for file_path, key in job['files']:
+        digest.update(f"\0{file_path}\0{key}".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+def write_plan(folder_path, jobs_file, skip=(), cache=None, refresh=False,
+               max_prompt_tokens=DEFAULT_MAX_PROMPT_TOKENS, pack_tokens=DEFAULT_PACK_TOKENS):
+    """
+    Plans the requests for a folder without calling the LLM and writes them to a JSONL job file.
+
+    Each line of the job file is one request, {"key": ..., "request": {"contents": [...]}}, in the
+    input format of the Gemini Batch API. The key is "<job id>-<part>", where the job ID is stable for
+    the same files with the same content. A JSONL index next to it (<jobs_file>.index) records the
+    kind, files and request keys of every job, and the analysis of files served from the cache, so
+    ingest_results() can match the results back to the files.
+    Returns the number of requests written.
+
+    Parameters:
+    - folder_path (str): Folder to analyze.
+    - jobs_file (str): Path of the job file to write.
+    - skip (set): Absolute paths of files to leave out.
+    - cache (ResponseCache): Cache of responses by file content, or None.
+    - refresh (bool): Plan requests even for cached files.
+    - max_prompt_tokens (int): Files larger than this are split into chunks of this size.
+    - pack_tokens (int): Size of the prompts small files are packed into, 0 to send every file alone.
+    """
+    requests = 0
+    with open(jobs_file, 'w', encoding='utf-8') as jobs_out, \
+            open(jobs_file + INDEX_SUFFIX, 'w', encoding='utf-8') as index_out:
+        for job in iter_jobs(folder_path, skip, cache, refresh, max_prompt_tokens, pack_tokens):
+            identifier = job_id(job)
+            entry = {'id': identifier, 'kind': job['kind'], 'files': job['files']}
+            if job['kind'] == 'cached':
+                entry['analysis'] = job['prompts'][0]
+            else:
+                entry['keys'] = [f"{identifier}-{part}" for part in range(1, len(job['prompts']) + 1)]
+                for key, prompt in zip(entry['keys'], job['prompts']):
+                    request = {'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]}
+                    jobs_out.write(json.dumps({'key': key, 'request': request}) + "\n")
+                requests += len(job['prompts'])
+            index_out.write(json.dumps(entry) + "\n")
+    return requests
+
+def parse_result_line(line):
+    """
+    Returns the key, response text (None for failed requests) and the (prompt, response, total)
+    token counts of one line of a results file. Both the Gemini Batch API output format,
+    {"key": ..., "response": {"candidates": [...], "usageMetadata": {...}}}, and a plain
+    {"key": ..., "text": ...} are accepted.
+    """
+    result = json.loads(line)
+    response = result.get('response') or {}
+    usage = response.get('usageMetadata') or response.get('usage_metadata') or {}
+    tokens = tuple(usage.get(camel) or usage.get(snake) or 0 for camel, snake in (
+        ('promptTokenCount', 'prompt_token_count'),
+        ('candidatesTokenCount', 'candidates_token_count'),
+        ('totalTokenCount', 'total_token_count')))
+    text = result.get('text', response.get('text'))
+    if text is None and response.get('candidates'):
+        parts = response['candidates'][0].get('content', {}).get('parts', [])
+        text = ''.join(part.get('text', '') for part in parts) or None
+    if result.get('error'):
+        text = None
+    return result.get('key'), text, tokens
+
+def ingest_results(jobs_file, results_file, cache=None, emit=None, skip=(), metrics=None):
+    """
+    Reads a JSONL results file for a job file written by write_plan(), assembles each job's
+    responses like an interactive run and records them with record_results(). Jobs with a missing
+    or failed request are reported as failed. Returns the number of files analyzed.
+
+    Parameters:
+    - jobs_file (str): Job file written by write_plan(); its index is read from <jobs_file>.index.
+    - results_file (str): JSONL results, one line per request key.
+    - cache (ResponseCache): Cache the new analyses are stored in, or None.
+    - emit (callable): Called with each file path and its analysis, or None.
+    - skip (set): Absolute paths of files already written by an earlier ingest, which are left out.
+    - metrics (RunMetrics): Collects the token usage of every job, or None.
+    """
+    responses = {}
+    with open(results_file, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
                 continue
-                
-            file_path = os.path.join(root, file)
-            rel_path = os.path.relpath(file_path, folder_path)
-            
-            # Skip files that match gitignore patterns
-            if gitignore and gitignore.match_file(rel_path):
+            try:
+                key, text, tokens = parse_result_line(line)
+            except (ValueError, AttributeError, IndexError) as e:
+                print(f"Error parsing line {number} of {results_file}: {e}")
                 continue
-                
-            print(f"Processing file: {file_path}")
-            analysis = analyze_file(file_path, client)
-            if analysis is not None:
-                results.append((file_path, analysis))
-    return results
+            responses[key] = (text, tokens)
 
-def write_output(results):
+    processed = 0
+    with open(jobs_file + INDEX_SUFFIX, 'r', encoding='utf-8') as index_in:
+        for line in index_in:
+            entry = json.loads(line)
+            files = [tuple(file) for file in entry['files']]
+            if all(os.path.abspath(file_path) in skip for file_path, _ in files):
+                continue
+            if entry['kind'] == 'cached':
+                job = new_job('cached', files, [entry['analysis']])
+                processed += record_results(job, [(*files[0], entry['analysis'])], cache, emit, metrics)
+                continue
+
+            job = new_job(entry['kind'], files, [])
+            texts = []
+            for key in entry['keys']:
+                text, tokens = responses.get(key, (None, (0, 0, 0)))
+                texts.append(text)
+                job['requests'] += 1
+                job['response_chars'] += len(text or "")
+                for name, count in zip(('prompt_tokens', 'response_tokens', 'total_tokens'), tokens):
+                    job[name] += count
+            if any(text is None for text in texts):
+                print(f"Missing or failed result for {', '.join(file_path for file_path, _ in files)}")
+                results = [(file_path, key, None) for file_path, key in files]
+            else:
+                results = assemble_results(job, texts)
+                for file_path, _, analysis in results:
+                    if analysis is None:
+                        print(f"Packed response has no section for {file_path}")
+            processed += record_results(job, results, cache, emit, metrics)
+    return processed
+
+def percentile(values, q):
+    """Returns the q-th percentile (0-100) of a sorted list by the nearest-rank method, or 0.0 if it is empty."""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+class RunMetrics:
     """
-    Writes the analysis results for all files to a timestamped output file.
-    Each file's output is separated by a line of equal signs.
+    Collects one record per job: the time spent reading files, building prompts, in model calls,
+    waiting for the rate limiter and backing off before retries, the duration of every model call,
+    the number of requests and retries, the prompt and response sizes, and the token usage reported
+    in the responses' usage metadata.
     """
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_filename = f"analysis_{timestamp}.txt"
-    separator = "\n" + "=" * 30 + "\n"
-    try:
-        with open(output_filename, 'w', encoding='utf-8') as f:
-            for file_path, analysis in results:
-                f.write(f"File: {file_path}\n")
-                f.write(analysis)
-                f.write(separator)
-        print(f"Analysis written to {output_filename}")
-    except Exception as e:
-        print(f"Error writing output file: {e}")
 
-def main():
-    parser = argparse.ArgumentParser(description="Analyze files in a folder using the Gemini LLM.")
-    parser.add_argument("folder", help="Path to the folder to analyze")
-    args = parser.parse_args()
-    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.records = []
+
+    def add(self, job, results):
+        """Records a finished job and the (file_path, cache key, analysis) results it produced."""
+        succeeded = sum(analysis is not None for _, _, analysis in results)
+        if job['kind'] == 'cached':
+            status = 'cached'
+        else:
+            status = 'ok' if succeeded == len(results) else 'error' if succeeded == 0 else 'partial'
+        record = {
+            'kind': job['kind'],
+            'status': status,
+            'files': [file_path for file_path, _ in job['files']],
+            'succeeded': succeeded,
+            'read_s': round(job['read_s'], 6),
+            'prompt_s': round(job['prompt_s'], 6),
+        }
+        for name in JOB_COUNTERS:
+            record[name] = round(job[name], 6) if name in JOB_TIMERS else job[name]
+        record['latencies'] = [round(latency, 6) for latency in job['latencies']]
+        record['total_s'] = round(job['read_s'] + job['prompt_s'] + sum(job[name] for name in JOB_TIMERS), 6)
+        self.records.append(record)
+
+    def summary(self):
+        """Returns the totals of the run as a dict."""
+        wall = time.perf_counter() - self.started
+        sent = [record for record in self.records if record['kind'] != 'cached']
+        latencies = sorted(latency for record in sent for latency in record['latencies'])
+        files = sum(record['succeeded'] for record in self.records)
+        tokens = sum(record['total_tokens'] for record in sent)
+        return {
+            'wall_s': round(wall, 3),
+            'files': files,
+            'cached_files': sum(record['succeeded'] for record in self.records if record['kind'] == 'cached'),
+            'failed_files': sum(len(record['files']) - record['succeeded'] for record in self.records),
+            'requests': sum(record['requests'] for record in sent),
+            'retries': sum(record['retries'] for record in sent),
+            'read_s': round(sum(record['read_s'] for record in self.records), 3),
+            'prompt_s': round(sum(record['prompt_s'] for record in self.records), 3),
+            'model_s': round(sum(record['model_s'] for record in sent), 3),
+            'limiter_s': round(sum(record['limiter_s'] for record in sent), 3),
+            'backoff_s': round(sum(record['backoff_s'] for record in sent), 3),
+            'latency_p50_s': round(percentile(latencies, 50), 3),
+            'latency_p95_s': round(percentile(latencies, 95), 3),
+            'latency_p99_s': round(percentile(latencies, 99), 3),
+            'prompt_tokens': sum(record['prompt_tokens'] for record in sent),
+            'response_tokens': sum(record['response_tokens'] for record in sent),
+            'total_tokens': tokens,
+            'files_per_s': round(files / wall, 3) if wall else 0.0,
+            'tokens_per_s': round(tokens / wall, 1) if wall else 0.0,
+        }
+
+    def print_summary(self):
+        """Prints the run summary and the slowest requests."""
+        summary = self.summary()
+        print(f"\nFiles: {summary['files']} analyzed ({summary['cached_files']} from cache), {summary['failed_files']} failed")
+        print(f"Requests: {summary['requests']}, retries: {summary['retries']}")
+        # Results ingested from a batch backend carry token usage but no timings
+        if summary['model_s']:
+            print(f"Latency per model call: p50 {summary['latency_p50_s']:.2f} s, p95 {summary['latency_p95_s']:.2f} s, "
+                  f"p99 {summary['latency_p99_s']:.2f} s")
+            print(f"Time in file reads: {summary['read_s']:.2f} s, prompt building: {summary['prompt_s']:.2f} s, "
+                  f"model calls: {summary['model_s']:.2f} s, rate limiter waits: {summary['limiter_s']:.2f} s, "
+                  f"retry backoff: {summary['backoff_s']:.2f} s")
+        print(f"Tokens: {summary['prompt_tokens']} prompt, {summary['response_tokens']} response, {summary['total_tokens']} total")
+        print(f"Throughput: {summary['files_per_s']:.2f} files/s, {summary['tokens_per_s']:.1f} tokens/s "
+              f"over {summary['wall_s']:.1f} s")
+        calls = ((latency, record) for record in self.records for latency in record['latencies'])
+        slowest = heapq.nlargest(SLOWEST_REQUESTS, calls, key=lambda call: call[0])
+        if slowest:
+            print("Slowest requests:")
+            for latency, record in slowest:
+                files = record['files'][0] + (f" (+{len(record['files']) - 1} files)" if len(record['files']) > 1 else "")
+                print(f"  {latency:8.2f} s  {record['kind']:<6} {files}")
+
+    def export(self, path):
+        """Writes the records to a CSV file if path ends with .csv, otherwise the summary and records to a JSON file."""
+        try:
+            if path.lower().endswith('.csv'):
+                with open(path, 'w', encoding='utf-8', newline='') as f:
+                    writer = csv.DictWriter(f, fieldnames=list(self.records[0]) if self.records else ['files'])
+                    writer.writeheader()
+                    for record in self.records:
+                        writer.writerow({**record, 'files': ';'.join(record['files']),
+                                         'latencies': ';'.join(str(latency) for latency in record['latencies'])})
+            else:
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump({'model': MODEL_NAME, 'summary': self.summary(), 'records': self.records}, f, indent=2)
+            print(f"Metrics written to {path}")
+        except OSError as e:
+            print(f"Error writing metrics file: {e}")
+
+def load_manifest(manifest_file):
+    """
+    Returns the absolute paths of the files recorded in a manifest and the output size after the last one.
+    A last line left incomplete by an interrupted run is ignored.
+    """
+    done = set()
+    end = 0
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            done.add(os.path.abspath(entry['path']))
+            end = entry['end']
+    return done, end
+
+def latest_output():
+    """Returns the newest analysis_*.txt output in the current directory that has a manifest, or None."""
+    outputs = [path for path in glob.glob("analysis_*.txt") if os.path.exists(path + MANIFEST_SUFFIX)]
+    return max(outputs, key=os.path.getmtime, default=None)
+
+class ResultWriter:
+    """
+    Appends each file's analysis to the output file as soon as it completes.
+
+    After each result the output is flushed and a line with the file path and the output size is
+    appended to a manifest next to it (<output>.manifest). When resuming, the output is truncated to
+    the size after the last recorded result, which drops anything written after it by an interrupted
+    run, and the recorded files are skipped.
+
+    Parameters:
+    - output_file (str): Path of the output file.
+    - resume (bool): Continue the output and manifest of an earlier run instead of starting new ones.
+    """
+
+    def __init__(self, output_file, resume=False):
+        self.output_file = output_file
+        self.manifest_file = output_file + MANIFEST_SUFFIX
+        self.done = set()
+        if resume:
+            self.done, end = load_manifest(self.manifest_file)
+            self.output = open(output_file, 'ab')
+            self.output.truncate(end)
+        else:
+            self.output = open(output_file, 'wb')
+        self.manifest = open(self.manifest_file, 'a' if resume else 'w', encoding='utf-8')
+        self.written = 0
+
+    def write(self, file_path, analysis):
+        """Appends one file's analysis, separated from the next one by a line of equal signs."""
+        self.output.write(f"File: {file_path}\n{analysis}{SEPARATOR}".encode('utf-8'))
+        self.output.flush()
+        os.fsync(self.output.fileno())
+        self.manifest.write(json.dumps({'path': file_path, 'end': self.output.tell()}) + "\n")
+        self.manifest.flush()
+        self.written += 1
+
+    def close(self):
+        self.output.close()
+        self.manifest.close()
+
+def create_client(args):
+    """Returns the local stub client if --stub was given, otherwise a Gemini client (or None without an API key)."""
+    if args.stub:
+        from stub_client import StubClient
+        return StubClient(latency=args.stub_latency, error_rate=args.stub_error_rate)
+
     # Check that the API key is set as an environment variable.
     api_key = os.environ.get("GOOGLE_API_KEY")
     if not api_key:
         print("Error: Please set the GOOGLE_API_KEY environment variable.")
-        return
-    
+        return None
+
+    from google import genai
     # Configure the Google Generative AI client with your API key and v1alpha version.
-    client = genai.Client(
+    return genai.Client(
         api_key=api_key,
         http_options={'api_version': 'v1alpha'}
     )
-    
-    results = process_folder(args.folder, client)
-    if results:
-        write_output(results)
+
+def close_cache(cache, max_age_days=None, max_size_mb=None):
+    """Prints the cache statistics, evicts old entries and closes the cache."""
+    print(f"Cache: {cache.hits} hits, {cache.misses} misses")
+    removed = cache.evict(max_age_days, max_size_mb)
+    if removed:
+        print(f"Evicted {removed} cache entries")
+    cache.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze files in a folder using the Gemini LLM.")
+    parser.add_argument("folder", nargs="?", help="Path to the folder to analyze (not needed with --ingest)")
+    parser.add_argument("--output", help="Output file (default: analysis_<timestamp>.txt)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted run, skipping the files in its manifest (default output: the newest one)")
+    parser.add_argument("--plan", metavar="JOBS", help="Write the requests to a JSONL job file for a batch backend instead of sending them")
+    parser.add_argument("--ingest", nargs=2, metavar=("JOBS", "RESULTS"),
+                        help="Write the report from a job file written by --plan and the batch backend's JSONL results")
+    parser.add_argument("--concurrency", type=int, default=1, help="Number of requests in flight at the same time (default: 1)")
+    parser.add_argument("--rpm", type=int, help="Maximum requests per minute (default: no limit)")
+    parser.add_argument("--tpm", type=int, help="Maximum prompt tokens per minute, estimated from the prompt length (default: no limit)")
+    parser.add_argument("--max_retries", type=int, default=DEFAULT_MAX_RETRIES,
+                        help=f"Retries of a request failing with 429 or 5xx (default: {DEFAULT_MAX_RETRIES})")
+    parser.add_argument("--max_prompt_tokens", type=int, default=DEFAULT_MAX_PROMPT_TOKENS,
+                        help=f"Split files larger than this many tokens into chunks (default: {DEFAULT_MAX_PROMPT_TOKENS})")
+    parser.add_argument("--pack_tokens", type=int, default=DEFAULT_PACK_TOKENS,
+                        help=f"Pack small files into prompts of up to this many tokens, 0 to send every file alone (default: {DEFAULT_PACK_TOKENS})")
+    parser.add_argument("--metrics", help="Export per-request metrics to a JSON file, or CSV if the name ends with .csv")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_FILE, help=f"Response cache database (default: {DEFAULT_CACHE_FILE})")
+    parser.add_argument("--no_cache", action="store_true", help="Neither read nor write the response cache")
+    parser.add_argument("--refresh", action="store_true", help="Send every file to the LLM again and update the cache")
+    parser.add_argument("--cache_max_age", type=float, help="Evict cache entries not used for this many days")
+    parser.add_argument("--cache_max_mb", type=float, help="Evict least recently used cache entries above this size in MiB")
+    parser.add_argument("--stub", action="store_true", help="Use a local stub instead of the Gemini API, for testing")
+    parser.add_argument("--stub_latency", type=float, default=0.5, help="Average latency of the stub in seconds (default: 0.5)")
+    parser.add_argument("--stub_error_rate", type=float, default=0.0,
+                        help="Fraction of stub requests failing with 429/5xx (default: 0.0)")
+    args = parser.parse_args()
+
+    if args.plan and args.ingest:
+        parser.error("--plan and --ingest cannot be used together")
+    if args.folder is None and not args.ingest:
+        parser.error("the folder is required unless --ingest is given")
+
+    if args.plan:
+        # Planning only walks the folder and builds the prompts, no client is needed
+        cache = None if args.no_cache else ResponseCache(args.cache)
+        try:
+            requests = write_plan(args.folder, args.plan, (), cache, args.refresh, args.max_prompt_tokens, args.pack_tokens)
+            print(f"Wrote {requests} requests to {args.plan} and the job index to {args.plan + INDEX_SUFFIX}")
+        except OSError as e:
+            print(f"Error writing job file: {e}")
+        if cache is not None:
+            close_cache(cache, args.cache_max_age, args.cache_max_mb)
+        return
+
+    client = None
+    if not args.ingest:
+        client = create_client(args)
+        if client is None:
+            return
+
+    output_file = args.output
+    if args.resume and output_file is None:
+        output_file = latest_output()
+        if output_file is None:
+            print("Error: No earlier output with a manifest found to resume.")
+            return
+    elif output_file is None:
+        output_file = f"analysis_{datetime.datetime.now():%Y%m%d_%H%M%S}.txt"
+    if args.resume and not os.path.exists(output_file + MANIFEST_SUFFIX):
+        print(f"Error: No manifest found for {output_file}.")
+        return
+
+    try:
+        writer = ResultWriter(output_file, args.resume)
+    except OSError as e:
+        print(f"Error opening output file: {e}")
+        return
+    if writer.done:
+        print(f"Resuming {output_file}: skipping {len(writer.done)} finished files")
+
+    limiter = RateLimiter(args.rpm, args.tpm) if args.rpm or args.tpm else None
+    cache = None if args.no_cache else ResponseCache(args.cache)
+    metrics = RunMetrics()
+    try:
+        if args.ingest:
+            ingest_results(args.ingest[0], args.ingest[1], cache, writer.write, writer.done, metrics)
+        else:
+            process_folder(args.folder, client, args.concurrency, limiter, args.max_retries, cache, args.refresh,
+                           writer.write, writer.done, args.max_prompt_tokens, args.pack_tokens, metrics)
+    except KeyboardInterrupt:
+        print(f"Interrupted, rerun with --resume to continue {output_file}")
+    except OSError as e:
+        print(f"Error reading batch files: {e}")
+    finally:
+        writer.close()
+    if writer.written or writer.done:
+        print(f"Analysis written to {output_file}")
     else:
+        os.remove(output_file)
+        os.remove(output_file + MANIFEST_SUFFIX)
         print("No files were processed.")
 
+    metrics.print_summary()
+    if args.metrics:
+        metrics.export(args.metrics)
+
+    if cache is not None:
+        close_cache(cache, args.cache_max_age, args.cache_max_mb)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,129 @@
+"""
+stub_client.py
+
+A local stand-in for the google-genai client used by analyze_folder_files.py.
+It exposes the same client.models.generate_content(model=..., contents=...) call, sleeps for a
+configurable latency and fails a configurable fraction of requests with 429/503 errors, so the
+dispatch, rate limiting and retry logic can be exercised without an API key or network access.
+Run as a script, it is a fake batch backend answering a job file written by
+analyze_folder_files.py --plan with a results file for --ingest.
+"""
+
+import re
+import json
+import time
+import argparse
+import random
+import threading
+from types import SimpleNamespace
+
+class StubAPIError(Exception):
+    """Error raised by the stub, carrying an HTTP status code like google.genai.errors.APIError."""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+class StubModels:
+    """Implements the client.models part of the stub client."""
+
+    def __init__(self, latency, jitter, error_rate, seed):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def generate_content(self, model, contents, config=None):
+        """
+        Sleeps for latency +/- jitter seconds, then either raises a StubAPIError or returns a
+        response with text and usage_metadata attributes like a real generate_content response.
+        """
+        with self.lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            failure = self.random.random() < self.error_rate
+            code = self.random.choice([429, 500, 503])
+        time.sleep(delay)
+        if failure:
+            raise StubAPIError(code, "Stub error")
+
+        prompt_tokens = len(contents) // 4 + 1
+        # Packed prompts get one section per file, headed by the file's header line as instructed
+        headers = re.findall(r"^=== FILE: .+? ===$", contents, re.MULTILINE)
+        if headers:
+            text = "\n\n".join(f"{header}\nStub analysis by {model}: no changes are needed." for header in headers)
+        else:
+            text = f"Stub analysis by {model} of a {len(contents)} character prompt: no changes are needed."
+        response_tokens = len(text) // 4 + 1
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=response_tokens,
+                total_token_count=prompt_tokens + response_tokens,
+            ),
+        )
+
+class StubClient:
+    """
+    Drop-in replacement for genai.Client in analyze_folder_files.py.
+
+    Parameters:
+    - latency (float): Average seconds each request takes.
+    - jitter (float): Maximum seconds added to or removed from the latency of each request.
+    - error_rate (float): Fraction of requests that fail with a 429, 500 or 503 error.
+    - seed (int): Seed of the random generator, for repeatable runs.
+    """
+
+    def __init__(self, latency=0.5, jitter=0.25, error_rate=0.0, seed=None):
+        self.models = StubModels(latency, jitter, error_rate, seed)
+
+def run_batch(jobs_file, results_file, client):
+    """
+    Answers every request of a JSONL job file with client and writes the results in the output format
+    of the Gemini Batch API: {"key": ..., "response": {"candidates": [...], "usageMetadata": {...}}},
+    or {"key": ..., "error": {...}} for failed requests. Returns the number of failed requests.
+    """
+    failed = 0
+    with open(jobs_file, 'r', encoding='utf-8') as jobs_in, open(results_file, 'w', encoding='utf-8') as results_out:
+        for line in jobs_in:
+            job = json.loads(line)
+            prompt = ''.join(part['text'] for content in job['request']['contents'] for part in content['parts'])
+            try:
+                response = client.models.generate_content(model='stub-batch', contents=prompt)
+            except StubAPIError as e:
+                failed += 1
+                result = {'key': job['key'], 'error': {'code': e.code, 'message': str(e)}}
+            else:
+                usage = response.usage_metadata
+                result = {
+                    'key': job['key'],
+                    'response': {
+                        'candidates': [{'content': {'role': 'model', 'parts': [{'text': response.text}]}}],
+                        'usageMetadata': {
+                            'promptTokenCount': usage.prompt_token_count,
+                            'candidatesTokenCount': usage.candidates_token_count,
+                            'totalTokenCount': usage.total_token_count,
+                        },
+                    },
+                }
+            results_out.write(json.dumps(result) + "\n")
+    return failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake batch backend: answer a job file from analyze_folder_files.py --plan")
+    parser.add_argument("jobs", help="JSONL job file written by --plan")
+    parser.add_argument("results", help="JSONL results file to write for --ingest")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds each request takes (default: 0.0)")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Fraction of requests that fail (default: 0.0)")
+    parser.add_argument("--seed", type=int, help="Seed of the random generator")
+    args = parser.parse_args()
+
+    client = StubClient(latency=args.latency, jitter=0.0, error_rate=args.error_rate, seed=args.seed)
+    failed = run_batch(args.jobs, args.results, client)
+    print(f"Results written to {args.results} ({failed} failed requests)")
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,36 @@
 Losslessly cut the last 60 s of every video in the current directory.
 Requires ffmpeg/ffprobe on PATH.
 Outputs are saved in the 'output' subfolder.
+With --jobs N, up to N videos are probed and cut at the same time.
+Videos whose output is newer than the input and was cut with the same ranges and mode
+are skipped unless --force is given, and probe results are cached by path, size and mtime.
+Several ranges can be extracted per video (--cuts, or a <video>.cuts sidecar file),
+all of them from a single ffmpeg pass over the input.
+With --smart, cuts are frame accurate: only the partial GOP before the first keyframe
+of each range is re-encoded, the rest is stream-copied and the two are concatenated.
+
+With --recursive, subdirectories are searched too and their outputs mirror the directory tree,
+and --watch keeps running, cutting each new video once it has stopped growing.
+
+ffmpeg's -progress output is used to report live progress and speed per file, and a summary
+of probe vs cut time and throughput is printed at the end (--report exports it as JSON).
 
 Usage:
-python main.py
+python ffmpeg_video_cutter.py [--jobs N] [--force] [--cuts RANGES] [--smart] [--recursive] [--watch] [--report FILE]
 """
 
+import argparse
+import datetime
+import json
 import os
 import subprocess
 import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from fractions import Fraction
 from pathlib import Path
 
 # ------------------------------------------------------------------
@@ -18,6 +40,22 @@ from pathlib import Path
 VIDEO_EXTS = {".mp4", ".mkv", ".mov", ".avi", ".flv", ".webm", ".ts", ".m4v", ".wmv"}
 CUT_DURATION = 60  # seconds
 OUTPUT_DIR = Path("output")
+PROBE_CACHE = OUTPUT_DIR / "probe_cache.json"  # ffprobe results and last cuts by path, size and mtime
+CUTS_SUFFIX = ".cuts"  # sidecar cut list next to a video, e.g. clip.cuts for clip.mp4
+WATCH_INTERVAL = 2  # seconds between directory scans in watch mode
+WATCH_SETTLE = 5  # seconds a video's size and mtime must stay unchanged before it is cut in watch mode
+PROGRESS_INTERVAL = 2  # seconds between live progress lines of a running ffmpeg
+SLOWEST_FILES = 10  # files listed in the run summary, slowest throughput first
+KEYFRAME_SEARCH_WINDOW = 20  # seconds of packets read per ffprobe call when searching for the next keyframe (--smart)
+# Encoders used by --smart to re-encode the partial GOP in the source's codec
+VIDEO_ENCODERS = {"h264": "libx264", "hevc": "libx265"}
+# Bitstream filters repeating the parameter sets (SPS/PPS) in-band before every keyframe (--smart)
+ANNEXB_FILTERS = {"h264": "h264_mp4toannexb", "hevc": "hevc_mp4toannexb"}
+# mp4 sample entries that allow parameter sets to change in-band (--smart)
+IN_BAND_TAGS = {"h264": "avc3", "hevc": "hev1"}
+
+# Guards the probe cache: jobs add entries while watch mode saves it
+CACHE_LOCK = threading.Lock()
 
 # ------------------------------------------------------------------
 # Helpers
@@ -34,8 +72,191 @@ def run(cmd: list[str]) -> str:
     return proc.stdout
 
 
-def get_duration(path: Path) -> float:
-    """Return duration in seconds using ffprobe."""
+@dataclass
+class Cut:
+    """
+    One range to extract. Negative times count back from the end of the video,
+    a missing start or end means the start or end of the video.
+    """
+    start: float | None = None
+    end: float | None = None
+    label: str | None = None
+
+    def resolve(self, duration: float) -> tuple[float, float]:
+        """Return the absolute (start, end) of the range in a video of the given duration."""
+        def absolute(value: float | None, default: float) -> float:
+            if value is None:
+                return default
+            return min(max(duration + value if value < 0 else value, 0.0), duration)
+
+        return absolute(self.start, 0.0), absolute(self.end, duration)
+
+
+DEFAULT_CUTS = [Cut(start=-CUT_DURATION)]
+
+
+@dataclass
+class JobResult:
+    """Outcome and measurements of processing one video."""
+    path: Path
+    elapsed: float = 0.0
+    error: Exception | None = None
+    skipped: bool = False
+    probe_s: float = 0.0  # time spent in ffprobe
+    cut_s: float = 0.0  # time spent in ffmpeg
+    media_s: float = 0.0  # seconds of media written, as reported by ffmpeg -progress
+    input_bytes: int = 0
+    output_bytes: int = 0
+
+    def mb_per_s(self) -> float:
+        """Return the MB written per second of cut time."""
+        return self.output_bytes / 1e6 / self.cut_s if self.cut_s else 0.0
+
+    def speed(self) -> float:
+        """Return the seconds of media written per second of cut time (x realtime)."""
+        return self.media_s / self.cut_s if self.cut_s else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "path": str(self.path),
+            "status": "failed" if self.error else "up to date" if self.skipped else "ok",
+            "error": str(self.error) if self.error else None,
+            "elapsed_s": round(self.elapsed, 3),
+            "probe_s": round(self.probe_s, 3),
+            "cut_s": round(self.cut_s, 3),
+            "media_s": round(self.media_s, 3),
+            "input_bytes": self.input_bytes,
+            "output_bytes": self.output_bytes,
+            "mb_per_s": round(self.mb_per_s(), 2),
+            "speed_x": round(self.speed(), 2),
+        }
+
+
+def load_probe_cache() -> dict:
+    """Load the probe cache, or return an empty one if it is missing or unreadable."""
+    try:
+        return json.loads(PROBE_CACHE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_probe_cache(cache: dict) -> None:
+    """Write the probe cache atomically, so an interrupted run cannot corrupt it."""
+    # json.dumps walks the dict lazily, so it must not change while it is serialized
+    with CACHE_LOCK:
+        data = json.dumps(cache, indent=1)
+    tmp_path = PROBE_CACHE.with_suffix(".tmp")
+    tmp_path.write_text(data, encoding="utf-8")
+    os.replace(tmp_path, PROBE_CACHE)
+
+
+def parse_time(text: str) -> float:
+    """Parse seconds, MM:SS or HH:MM:SS (fractions allowed), with a leading '-' counting from the end."""
+    text = text.strip()
+    sign = -1.0 if text.startswith("-") else 1.0
+    seconds = 0.0
+    for part in text.lstrip("-").split(":"):
+        seconds = seconds * 60 + float(part)
+    return sign * seconds
+
+
+def parse_cut(text: str) -> Cut:
+    """Parse a range 'START..END [label]', e.g. '0..30', '-60..' or '1:02:00..1:02:30 goal'."""
+    spec, _, label = text.strip().partition(" ")
+    if ".." not in spec:
+        raise ValueError(f"invalid range {text!r}, expected START..END")
+    start, end = spec.split("..", 1)
+    return Cut(
+        parse_time(start) if start else None,
+        parse_time(end) if end else None,
+        label.strip() or None,
+    )
+
+
+def parse_cut_list(text: str) -> list[Cut]:
+    """Parse a comma separated list of ranges given on the command line."""
+    return [parse_cut(item) for item in text.split(",") if item.strip()]
+
+
+def cut_file(path: Path) -> Path:
+    """Return the path of a video's sidecar cut list."""
+    return path.with_suffix(CUTS_SUFFIX)
+
+
+def load_cut_file(path: Path) -> list[Cut]:
+    """Load a sidecar cut list: one range per line, '#' starts a comment."""
+    cuts = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.split("#", 1)[0].strip()
+        if line:
+            cuts.append(parse_cut(line))
+    return cuts
+
+
+def output_paths(path: Path, cuts: list[Cut]) -> list[Path]:
+    """Return the output path of each cut of a video, in the same subdirectory of the output folder as the video."""
+    out_dir = OUTPUT_DIR / path.parent
+    if len(cuts) == 1 and cuts[0].label is None:
+        return [out_dir / f"{path.stem}_cut.mp4"]
+    return [out_dir / f"{path.stem}_{cut.label or f'cut{number}'}.mp4" for number, cut in enumerate(cuts, start=1)]
+
+
+def cache_entry(path: Path, cache: dict | None) -> dict | None:
+    """Return the probe cache entry of a video, or None if there is none or the video changed since."""
+    if cache is None:
+        return None
+    stat = path.stat()
+    entry = cache.get(str(path.resolve()))
+    if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry
+    return None
+
+
+def cut_spec(cuts: list[Cut], duration: float, smart: bool) -> dict:
+    """Return the resolved ranges and mode of a video's cuts, as recorded in the probe cache."""
+    return {
+        "mode": "smart" if smart else "copy",
+        "cuts": [[round(start, 3), round(end, 3), cut.label] for cut, (start, end) in
+                 ((cut, cut.resolve(duration)) for cut in cuts)],
+    }
+
+
+def record_cuts(path: Path, cache: dict | None, cuts: list[Cut], smart: bool) -> None:
+    """Record the cuts just written for a video in its probe cache entry."""
+    entry = cache_entry(path, cache)
+    if entry is not None:
+        with CACHE_LOCK:
+            cache[str(path.resolve())] = {**entry, "cut": cut_spec(cuts, entry["duration"], smart)}
+
+
+def is_up_to_date(path: Path, cuts: list[Cut], smart: bool = False, cache: dict | None = None) -> bool:
+    """
+    Return True if every output of the video exists and is newer than the video and its cut list,
+    and the probe cache records that they were cut with the same resolved ranges and mode.
+    """
+    try:
+        newest_input = path.stat().st_mtime_ns
+        if cut_file(path).exists():
+            newest_input = max(newest_input, cut_file(path).stat().st_mtime_ns)
+        if not all(out_path.stat().st_mtime_ns >= newest_input for out_path in output_paths(path, cuts)):
+            return False
+    except FileNotFoundError:
+        return False
+    # Output names do not change with the ranges, e.g. <name>_cut.mp4 for any single unlabeled cut
+    entry = cache_entry(path, cache)
+    return entry is not None and entry.get("cut") == cut_spec(cuts, entry["duration"], smart)
+
+
+def get_duration(path: Path, cache: dict | None = None) -> float:
+    """
+    Return duration in seconds using ffprobe.
+    With a cache, the result is reused while the file's size and mtime are unchanged.
+    """
+    entry = cache_entry(path, cache)
+    if entry is not None:
+        return entry["duration"]
+
+    stat = path.stat()
     cmd = [
         "ffprobe",
         "-v",
@@ -46,56 +267,478 @@ def get_duration(path: Path) -> float:
         "csv=p=0",
         str(path),
     ]
-    return float(run(cmd).strip())
+    duration = float(run(cmd).strip())
+    if cache is not None:
+        with CACHE_LOCK:
+            cache[str(path.resolve())] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "duration": duration}
+    return duration
 
 
-def ffmpeg_trim_last(path: Path, duration: float) -> None:
-    """Losslessly cut the last CUT_DURATION seconds and save to output subfolder."""
-    start = max(duration - CUT_DURATION, 0)
-    OUTPUT_DIR.mkdir(exist_ok=True)
-    out_path = OUTPUT_DIR / f"{path.stem}_cut.mp4"
+def ffmpeg_command(*args: str) -> list[str]:
+    """
+    Return an ffmpeg command line with the usual quiet, non-interactive options,
+    writing machine-readable progress to stdout for run_ffmpeg().
+    """
+    # -nostdin: parallel jobs must not wait on the terminal for an overwrite prompt
+    return ["ffmpeg", "-hide_banner", "-nostdin", "-y", "-loglevel", "error", "-progress", "pipe:1", "-nostats", *args]
+
+
+def run_ffmpeg(cmd: list[str], label: str, span: float) -> float:
+    """
+    Run an ffmpeg command from ffmpeg_command() and print its progress, speed and output size
+    every PROGRESS_INTERVAL seconds. span is the expected seconds of media, for the percentage.
+    Return the seconds of media written. Raise CalledProcessError if ffmpeg fails.
+    """
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    progress = {}
+    out_time = 0.0
+    last_report = time.monotonic()
+    # ffmpeg writes blocks of key=value lines, each ending with progress=continue or progress=end
+    for line in proc.stdout:
+        key, _, value = line.strip().partition("=")
+        progress[key] = value
+        if key != "progress":
+            continue
+        if progress.get("out_time_us", "N/A").lstrip("-").isdigit():
+            out_time = max(0.0, int(progress["out_time_us"]) / 1e6)
+        now = time.monotonic()
+        if value == "continue" and now - last_report >= PROGRESS_INTERVAL:
+            last_report = now
+            size = progress.get("total_size", "0")
+            size_mb = int(size) / 1e6 if size.isdigit() else 0.0
+            percent = min(100.0, 100 * out_time / span) if span else 0.0
+            print(f"{label}: {percent:5.1f}%  {progress.get('speed', 'N/A').strip()}  {size_mb:.1f} MB")
+    if proc.wait() != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+    return out_time
+
 
+def ffmpeg_cut(path: Path, duration: float, cuts: list[Cut]) -> float:
+    """
+    Losslessly extract every cut in a single ffmpeg pass and save them to the output subfolder.
+
+    The input is opened once, seeking to the earliest start, and each cut is one output of the
+    same command with its own output-side -ss/-t, so the input is read only once however many
+    cuts there are. The earliest cut starts at the keyframe before its start, as with an input
+    seek; later cuts start at the first keyframe after their start.
+    Return the seconds of media read from the input.
+    """
+    ranges = [cut.resolve(duration) for cut in cuts]
+    for cut, (start, end) in zip(cuts, ranges):
+        if end <= start:
+            raise ValueError(f"empty range {cut.start}..{cut.end} in a {duration:.2f} s video")
+    seek = min(start for start, _ in ranges)
+    out_paths = output_paths(path, cuts)
+    out_paths[0].parent.mkdir(parents=True, exist_ok=True)
+    # Written under temporary names first, so an interrupted cut never looks up to date
+    tmp_paths = [out_path.with_name(f"{out_path.stem}.part{out_path.suffix}") for out_path in out_paths]
+
+    cmd = ffmpeg_command("-ss", str(seek), "-i", str(path))
+    for (start, end), tmp_path in zip(ranges, tmp_paths):
+        # Output options are relative to the seek point, the earliest cut keeps the input seek as is
+        if start > seek:
+            cmd += ["-ss", str(start - seek)]
+        cmd += ["-t", str(end - start), "-c", "copy", "-avoid_negative_ts", "make_zero", str(tmp_path)]
+    try:
+        media_s = run_ffmpeg(cmd, str(path), max(end for _, end in ranges) - seek)
+        for tmp_path, out_path in zip(tmp_paths, out_paths):
+            os.replace(tmp_path, out_path)
+    finally:
+        for tmp_path in tmp_paths:
+            tmp_path.unlink(missing_ok=True)
+    for out_path in out_paths:
+        print(f"Saved: {out_path}")
+    return media_s
+
+
+def probe_streams(path: Path) -> dict:
+    """Return the first video and audio stream of a video (or None) and its start time, using ffprobe."""
     cmd = [
-        "ffmpeg",
-        "-hide_banner",
-        "-loglevel",
+        "ffprobe",
+        "-v",
         "error",
-        "-ss",
-        str(start),
-        "-i",
+        "-show_entries",
+        "stream=codec_type,codec_name,pix_fmt,r_frame_rate,time_base,sample_rate,channels,bit_rate:format=start_time",
+        "-of",
+        "json",
         str(path),
-        "-c",
-        "copy",
-        "-avoid_negative_ts",
-        "make_zero",
-        str(out_path),
     ]
-    subprocess.run(cmd, check=True)
-    print(f"Saved: {out_path}")
+    info = json.loads(run(cmd))
+    streams = {"video": None, "audio": None, "start_time": float(info.get("format", {}).get("start_time") or 0)}
+    for stream in info.get("streams", []):
+        if stream.get("codec_type") in ("video", "audio") and streams[stream["codec_type"]] is None:
+            streams[stream["codec_type"]] = stream
+    return streams
+
+
+def encoder_args(streams: dict) -> list[str]:
+    """
+    Return ffmpeg options re-encoding a video stream in the same codec, pixel format and frame rate
+    as the source. Profile, level and reference frames are left to the encoder: the pieces are joined
+    with their own parameter sets in-band, so they do not have to match the source's.
+    Raise ValueError if the source has no video or a codec without a known encoder.
+    """
+    video = streams["video"]
+    if video is None or video.get("codec_name") not in VIDEO_ENCODERS:
+        raise ValueError(f"cannot re-encode video codec {video and video.get('codec_name')}")
+    return ["-c:v", VIDEO_ENCODERS[video["codec_name"]], "-pix_fmt", video["pix_fmt"], "-r", video["r_frame_rate"],
+            "-crf", "16", "-preset", "veryfast"]
+
+
+def next_keyframe(path: Path, start: float, end: float, streams: dict) -> float | None:
+    """
+    Return the time of the first video keyframe at or after start and before end, or None if there
+    is none. The packets are read with ffprobe KEYFRAME_SEARCH_WINDOW seconds at a time, so a
+    keyframe close to start is found without reading the packets of the whole range.
+    """
+    offset = streams["start_time"]
+    tolerance = 0.5 / float(Fraction(streams["video"]["r_frame_rate"]))
+    window_start = start
+    while window_start < end:
+        window_end = min(window_start + KEYFRAME_SEARCH_WINDOW, end)
+        cmd = [
+            "ffprobe",
+            "-v",
+            "error",
+            "-select_streams",
+            "v:0",
+            "-read_intervals",
+            f"{window_start + offset}%{window_end + offset}",
+            "-show_entries",
+            "packet=pts_time,flags",
+            "-of",
+            "csv=p=0",
+            str(path),
+        ]
+        keyframes = []
+        for line in run(cmd).splitlines():
+            pts_time, _, flags = line.partition(",")
+            if "K" in flags and pts_time not in ("", "N/A"):
+                time_ = float(pts_time) - offset
+                if start - tolerance <= time_ < end:
+                    keyframes.append(time_)
+        if keyframes:
+            return min(keyframes)
+        window_start = window_end
+    return None
+
+
+def ffmpeg_smart_cut(path: Path, duration: float, cuts: list[Cut]) -> float:
+    """
+    Frame-accurately extract every cut and save them to the output subfolder.
+
+    For each cut, the next keyframe after its start is looked up in the packet index. Only the
+    partial GOP of the video from the start to that keyframe is re-encoded, with accurate seeking;
+    the rest is stream-copied from the keyframe. Both pieces are written as NUT with their
+    parameter sets in-band (Annex B) before every keyframe, joined with the concat demuxer and
+    remuxed to mp4 with an avc3/hev1 sample entry, so the copied part keeps decoding with its own SPS/PPS
+    rather than the re-encoded part's. Audio is stream-copied over the whole cut, so no encoder
+    priming lands at the join. A cut starting on a keyframe is copied as is, and only a cut
+    with no keyframe anywhere between its start and end is re-encoded whole. Videos in codecs other than H.264 and HEVC fall back
+    to keyframe cuts. Return the seconds of media written.
+    """
+    streams = probe_streams(path)
+    try:
+        encode = encoder_args(streams)
+    except ValueError as e:
+        print(f"{path}: {e}, falling back to keyframe cuts")
+        return ffmpeg_cut(path, duration, cuts)
+
+    video = streams["video"]
+    codec = video["codec_name"]
+    timescale = str(Fraction(video["time_base"]).denominator)
+    frame = 1 / float(Fraction(video["r_frame_rate"]))
+    tolerance = frame / 2
+    media_s = 0.0
+    for cut, out_path in zip(cuts, output_paths(path, cuts)):
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        start, end = cut.resolve(duration)
+        if end <= start:
+            raise ValueError(f"empty range {cut.start}..{cut.end} in a {duration:.2f} s video")
+        keyframe = next_keyframe(path, start, end, streams)
+        head_end = end if keyframe is None else keyframe
+        if keyframe is not None and keyframe - start > tolerance:
+            # Start on the frame shown at start, so the re-encoded part is a whole number of frames long
+            start = keyframe - int((keyframe - start + tolerance) / frame) * frame
+
+        # Pieces are written next to the outputs, so the finished cut can be moved into place
+        with tempfile.TemporaryDirectory(dir=out_path.parent) as tmp_dir:
+            # NUT keeps the Annex B packets, with their parameter sets, and timestamps unchanged
+            concat_lines = []
+            if head_end - start > tolerance:
+                head = Path(tmp_dir) / "head.nut"
+                cmd = ffmpeg_command("-ss", str(start), "-i", str(path), "-t", str(head_end - start),
+                                     "-map", "0:v:0", *encode, "-bsf:v", ANNEXB_FILTERS[codec], "-f", "nut", str(head))
+                media_s += run_ffmpeg(cmd, f"{path} (re-encode)", head_end - start)
+                # The demuxer's own estimate of the head's length is off by the encoder delay
+                concat_lines += [f"file '{head.resolve()}'", f"duration {head_end - start}"]
+            if keyframe is not None:
+                tail = Path(tmp_dir) / "tail.nut"
+                cmd = ffmpeg_command("-ss", str(keyframe), "-i", str(path), "-t", str(end - keyframe),
+                                     "-map", "0:v:0", "-c", "copy", "-bsf:v", ANNEXB_FILTERS[codec], "-f", "nut", str(tail))
+                media_s += run_ffmpeg(cmd, f"{path} (copy)", end - keyframe)
+                concat_lines.append(f"file '{tail.resolve()}'")
+
+            # Video from the joined pieces, audio stream-copied from the source over the whole cut
+            joined = Path(tmp_dir) / f"joined{out_path.suffix}"
+            concat_list = Path(tmp_dir) / "concat.txt"
+            concat_list.write_text("".join(f"{line}\n" for line in concat_lines), encoding="utf-8")
+            cmd = ffmpeg_command("-f", "concat", "-safe", "0", "-i", str(concat_list), "-ss", str(start), "-i", str(path),
+                                 "-map", "0:v", "-map", "1:a:0?", "-t", str(end - start), "-c", "copy",
+                                 "-tag:v", IN_BAND_TAGS[codec], "-video_track_timescale", timescale, str(joined))
+            run_ffmpeg(cmd, f"{path} (join)", end - start)
+            os.replace(joined, out_path)
+        reencoded = head_end - start if head_end - start > tolerance else 0.0
+        print(f"Saved: {out_path} (re-encoded {reencoded:.2f} s of {end - start:.2f} s)")
+    return media_s
+
+
+def ffmpeg_trim_last(path: Path, duration: float) -> None:
+    """Losslessly cut the last CUT_DURATION seconds and save to output subfolder."""
+    ffmpeg_cut(path, duration, DEFAULT_CUTS)
+
+
+def process_file(path: Path, cache: dict | None = None, force: bool = False,
+                 cuts: list[Cut] | None = None, smart: bool = False) -> JobResult:
+    """
+    Probe and cut one video, unless its outputs are up to date and force is False.
+    Outputs are up to date only if they were cut with the same ranges and mode, as recorded in the cache.
+    The video's sidecar cut list is used if it has one, otherwise cuts, otherwise the last CUT_DURATION seconds.
+    """
+    result = JobResult(path)
+    started = time.perf_counter()
+    try:
+        if cut_file(path).exists():
+            cuts = load_cut_file(cut_file(path))
+        cuts = cuts or DEFAULT_CUTS
+        if not force and is_up_to_date(path, cuts, smart, cache):
+            result.skipped = True
+            return result
+        result.input_bytes = path.stat().st_size
+        dur = get_duration(path, cache)
+        result.probe_s = time.perf_counter() - started
+        print(f"{path}: {dur:.2f} s")
+        cut_started = time.perf_counter()
+        try:
+            if smart:
+                result.media_s = ffmpeg_smart_cut(path, dur, cuts)
+            else:
+                result.media_s = ffmpeg_cut(path, dur, cuts)
+        finally:
+            result.cut_s = time.perf_counter() - cut_started
+        result.output_bytes = sum(out_path.stat().st_size for out_path in output_paths(path, cuts))
+        record_cuts(path, cache, cuts, smart)
+    except Exception as e:
+        result.error = e
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def print_summary(results: list[JobResult], wall_time: float) -> None:
+    """Print probe vs cut time, the files with the lowest throughput and the total throughput."""
+    cut = [r for r in results if not r.skipped and r.error is None]
+    probe_s = sum(r.probe_s for r in results)
+    cut_s = sum(r.cut_s for r in results)
+    output_mb = sum(r.output_bytes for r in cut) / 1e6
+    print(f"Probe time: {probe_s:.2f} s, cut time: {cut_s:.2f} s (summed over files)")
+    if cut:
+        print("Slowest files:")
+        for r in sorted(cut, key=JobResult.mb_per_s)[:SLOWEST_FILES]:
+            print(
+                f"  {r.mb_per_s():8.1f} MB/s {r.speed():7.1f}x  probe {r.probe_s:6.2f} s  "
+                f"cut {r.cut_s:6.2f} s  {r.output_bytes / 1e6:8.1f} MB  {r.path}"
+            )
+    print(f"Total: {output_mb:.1f} MB written in {wall_time:.2f} s, "
+          f"{output_mb / wall_time if wall_time else 0.0:.1f} MB/s")
+
+
+def write_report(report_path: Path, results: list[JobResult], wall_time: float, args: argparse.Namespace) -> None:
+    """Write the per-file measurements and totals of a run to a JSON file."""
+    cut = [r for r in results if not r.skipped and r.error is None]
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "jobs": args.jobs,
+        "smart": args.smart,
+        "wall_s": round(wall_time, 3),
+        "totals": {
+            "files": len(results),
+            "cut": len(cut),
+            "failed": sum(r.error is not None for r in results),
+            "up_to_date": sum(r.skipped for r in results),
+            "probe_s": round(sum(r.probe_s for r in results), 3),
+            "cut_s": round(sum(r.cut_s for r in results), 3),
+            "output_bytes": sum(r.output_bytes for r in cut),
+            "mb_per_s": round(sum(r.output_bytes for r in cut) / 1e6 / wall_time, 2) if wall_time else 0.0,
+        },
+        "files": [r.as_dict() for r in results],
+    }
+    report_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Report written to {report_path}")
+
+
+def find_videos(root: Path, recursive: bool = False) -> list[Path]:
+    """Return the videos in root, and in its subdirectories if recursive, skipping the output folder."""
+    if not recursive:
+        return sorted(p for p in root.iterdir() if p.suffix.lower() in VIDEO_EXTS and p.is_file())
+    output_dir = OUTPUT_DIR.resolve()
+    files = []
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names[:] = sorted(d for d in dir_names if (Path(dir_path) / d).resolve() != output_dir)
+        files.extend(
+            Path(dir_path) / name
+            for name in sorted(file_names)
+            if Path(name).suffix.lower() in VIDEO_EXTS and (Path(dir_path) / name).is_file()
+        )
+    return files
+
+
+def watch(args: argparse.Namespace, cache: dict) -> None:
+    """
+    Poll the current directory and cut every video once it is complete, until interrupted.
+
+    A video counts as complete when its size and mtime are the same in two consecutive scans
+    and it has not been modified for --settle seconds. At most --jobs videos are cut at a time;
+    the others wait for a free worker. A video is cut again only if it changes afterwards.
+    """
+    seen: dict[Path, tuple[int, int]] = {}  # size and mtime at the previous scan
+    done: dict[Path, tuple[int, int]] = {}  # size and mtime when the video was processed
+    running: dict = {}  # future -> (path, size and mtime)
+    results: list[JobResult] = []
+    started = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=max(1, args.jobs))
+    print(f"Watching {Path('.').resolve()} every {args.interval} s, press Ctrl-C to stop")
+    try:
+        while True:
+            finished = [future for future in running if future.done()]
+            for future in finished:
+                path, signature = running.pop(future)
+                result = future.result()
+                done[path] = signature
+                if result.error is not None:
+                    print(f"Skipping {result.path}: {result.error}")
+                if not result.skipped:
+                    results.append(result)
+            # Saved once no job is left running, so the file holds every finished job's entries
+            if finished and not running:
+                save_probe_cache(cache)
+
+            now = time.time()
+            busy = {path for path, _ in running.values()}
+            current = {}
+            for path in find_videos(Path("."), args.recursive):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                signature = (stat.st_size, stat.st_mtime_ns)
+                current[path] = signature
+                if path in busy or done.get(path) == signature:
+                    continue
+                stable = seen.get(path) == signature and now - stat.st_mtime >= args.settle
+                if stable and len(running) < args.jobs:
+                    future = pool.submit(process_file, path, cache, args.force, args.cuts, args.smart)
+                    running[future] = (path, signature)
+            seen = current
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print(f"\nStopping, waiting for {len(running)} running job(s)")
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        save_probe_cache(cache)
+    wall_time = time.perf_counter() - started
+    failed = sum(r.error is not None for r in results)
+    print(f"Processed {len(results)} files ({failed} failed)")
+    print_summary(results, wall_time)
+    if args.report:
+        write_report(args.report, results, wall_time, args)
 
 
 # ------------------------------------------------------------------
 # Main
 # ------------------------------------------------------------------
+def join_negative_cuts(argv: list[str]) -> list[str]:
+    """
+    Return argv with "--cuts" and a following value starting with a negative time, such as "-60..",
+    joined to "--cuts=-60..". argparse would otherwise take the value for an unknown option.
+    """
+    joined = []
+    for arg in argv:
+        if joined and joined[-1] == "--cuts" and arg[:1] == "-" and (arg[1:2].isdigit() or arg[1:2] in (".", ":")):
+            joined[-1] = f"--cuts={arg}"
+        else:
+            joined.append(arg)
+    return joined
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=f"Losslessly cut the last {CUT_DURATION} s of every video in the current directory.")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of videos processed at the same time (default: 1)")
+    parser.add_argument("--force", action="store_true", help="Cut videos again even if their output is up to date")
+    parser.add_argument(
+        "--cuts",
+        type=parse_cut_list,
+        help="Comma separated ranges START..END to extract from every video without a .cuts sidecar file, "
+        "times in seconds or [HH:]MM:SS, negative from the end, e.g. --cuts -60.. (default: -%d..)" % CUT_DURATION,
+    )
+    parser.add_argument(
+        "--smart",
+        action="store_true",
+        help="Frame-accurate cuts: re-encode only the partial GOP at the start of each range and stream-copy the rest",
+    )
+    parser.add_argument("--report", type=Path, help="Write per-file timings and throughput to a JSON file")
+    parser.add_argument("--recursive", action="store_true", help="Also process videos in subdirectories")
+    parser.add_argument("--watch", action="store_true", help="Keep running and cut new videos as soon as they are complete")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL,
+                        help=f"Seconds between directory scans in watch mode (default: {WATCH_INTERVAL})")
+    parser.add_argument("--settle", type=float, default=WATCH_SETTLE,
+                        help=f"Seconds a video must stay unchanged before it is cut in watch mode (default: {WATCH_SETTLE})")
+    return parser.parse_args(join_negative_cuts(sys.argv[1:]))
+
+
 def main() -> None:
-    files = [
-        Path(p)
-        for p in os.listdir(".")
-        if Path(p).suffix.lower() in VIDEO_EXTS and Path(p).is_file()
-    ]
+    args = parse_args()
+    if args.watch:
+        OUTPUT_DIR.mkdir(exist_ok=True)
+        watch(args, load_probe_cache())
+        return
+
+    files = find_videos(Path("."), args.recursive)
     if not files:
         print("No video files found in current directory.")
         sys.exit(0)
 
     OUTPUT_DIR.mkdir(exist_ok=True)
 
-    for f in files:
-        try:
-            dur = get_duration(f)
-            print(f"{f.name}: {dur:.2f} s")
-            ffmpeg_trim_last(f, dur)
-        except Exception as e:
-            print(f"Skipping {f.name}: {e}")
+    # Each job mostly waits on ffprobe/ffmpeg subprocesses, so threads are enough to run them in parallel
+    cache = load_probe_cache()
+    started = time.perf_counter()
+    job_time = 0.0
+    errors = []
+    skipped = 0
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = [pool.submit(process_file, f, cache, args.force, args.cuts, args.smart) for f in files]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            job_time += result.elapsed
+            skipped += result.skipped
+            if result.error is not None:
+                errors.append((result.path, result.error))
+                print(f"Skipping {result.path}: {result.error}")
+    wall_time = time.perf_counter() - started
+    save_probe_cache(cache)
+
+    print(
+        f"\nProcessed {len(files) - skipped} files ({len(errors)} failed, {skipped} up to date) in {wall_time:.2f} s "
+        f"with {args.jobs} job(s); sum of per-file times {job_time:.2f} s, "
+        f"speedup {job_time / wall_time if wall_time else 1.0:.2f}x"
+    )
+    for path, error in errors:
+        print(f"  {path}: {error}")
+    print_summary(results, wall_time)
+    if args.report:
+        write_report(args.report, results, wall_time, args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+import platform
+import tempfile
+import contextlib
+import multiprocessing
+from queue import Empty
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Not available on Windows, peak RSS is then not reported
+
+from log_filter import filter_log
+
+# Modes measured by the benchmark, in the order they are run.
+MODES = ['baseline', 'streaming', 'parallel', 'multi_pattern']
+# Search string placed in the matching lines of the synthetic log.
+SEARCH_STRING = 'ERROR'
+# Number of distinct error codes in the synthetic log, each one a pattern in multi_pattern mode.
+ERROR_CODES = 12
+# Words the messages of the synthetic log are built from.
+WORDS = ['request', 'user', 'session', 'cache', 'timeout', 'retry', 'connection', 'worker', 'queue',
+         'payload', 'handler', 'latency', 'upstream', 'database', 'commit', 'token', 'lookup', 'shard']
+COMPONENTS = ['api', 'auth', 'billing', 'db', 'scheduler', 'storage', 'web']
+OTHER_LEVELS = ['INFO', 'DEBUG', 'WARN']
+# Seconds between checks that the process running a mode is still alive.
+POLL_INTERVAL = 1
+
+def generate_log(path, size, line_length=120, density=0.01, seed=0):
+    """
+    Writes a deterministic synthetic log file and returns the number of lines written.
+
+    The same arguments always produce the same file, so benchmark runs are comparable.
+
+    Parameters:
+    - path (str): Path of the log file to create.
+    - size (int): Approximate size of the file in bytes.
+    - line_length (int): Average line length in bytes; lengths vary by +/-50%.
+    - density (float): Fraction of lines containing SEARCH_STRING.
+    - seed (int): Seed of the random generator.
+    """
+    rng = random.Random(seed)
+    timestamp = datetime.datetime(2024, 1, 1)
+    written = 0
+    lines = 0
+    block = []
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        while written < size:
+            timestamp += datetime.timedelta(milliseconds=rng.randint(0, 50))
+            if rng.random() < density:
+                level = f"{SEARCH_STRING} code=E{rng.randrange(ERROR_CODES):03d}"
+            else:
+                level = rng.choice(OTHER_LEVELS)
+            prefix = f"{timestamp:%Y-%m-%d %H:%M:%S}.{timestamp.microsecond // 1000:03d} {level} {rng.choice(COMPONENTS)}:"
+            target = rng.randint(line_length // 2, line_length * 3 // 2)
+            words = []
+            length = len(prefix)
+            while length < target:
+                word = rng.choice(WORDS)
+                words.append(word)
+                length += len(word) + 1
+            line = f"{prefix} {' '.join(words)}\n"
+            block.append(line)
+            written += len(line)
+            lines += 1
+            if len(block) >= 10000:
+                f.write(''.join(block))
+                block = []
+        f.write(''.join(block))
+    return lines
+
+def baseline_filter(input_file, output_file, search_string):
+    """
+    The original readlines() implementation of filter_log, kept as the reference point.
+    Returns the number of matching lines.
+    """
+    with open(input_file, 'r', encoding='utf-8') as infile:
+        lines = infile.readlines()
+    filtered_lines = [line for line in lines if search_string in line]
+    with open(output_file, 'w', encoding='utf-8') as outfile:
+        outfile.writelines(filtered_lines)
+    return len(filtered_lines)
+
+def peak_rss_mb(who):
+    """Returns the peak resident set size in MiB of RUSAGE_SELF or RUSAGE_CHILDREN, or None."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB everywhere else
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def run_mode(mode, log_file, output_file, workers, queue):
+    """
+    Runs one benchmark mode and puts (wall time, match count, peak RSS, workers peak RSS) on queue.
+
+    Each mode runs in a fresh process, so its peak RSS is not inflated by the modes before it.
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        if mode == 'baseline':
+            matches = baseline_filter(log_file, output_file, SEARCH_STRING)
+        elif mode == 'streaming':
+            matches = filter_log(log_file, output_file, SEARCH_STRING)
+        elif mode == 'parallel':
+            matches = filter_log(log_file, output_file, SEARCH_STRING, workers=workers)
+        else:
+            patterns = [(f"code=E{code:03d}", False, None) for code in range(ERROR_CODES)]
+            matches = filter_log(log_file, output_file, patterns=patterns)
+        wall_time = time.perf_counter() - start
+    queue.put((wall_time, matches, peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+               peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None))
+
+def measure(mode, log_file, output_file, workers):
+    """
+    Runs mode in a separate process and returns (run_mode() results, exit code of the process).
+
+    The results are None if the process died without sending any, e.g. when it was killed
+    for running out of memory.
+    """
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=run_mode, args=(mode, log_file, output_file, workers, queue))
+    process.start()
+    result = None
+    while True:
+        try:
+            result = queue.get(timeout=POLL_INTERVAL)
+            break
+        except Empty:
+            if not process.is_alive():
+                # The results may have been sent just before the process exited
+                try:
+                    result = queue.get(timeout=POLL_INTERVAL)
+                except Empty:
+                    pass
+                break
+    process.join()
+    return result, process.exitcode
+
+def run_benchmark(log_file, size, lines, modes, workers, repeat):
+    """
+    Measures each mode repeat times on log_file and returns one result dict per mode.
+    The fastest run of each mode is reported. A mode whose process dies is reported as failed,
+    with the exit code of the process, and the benchmark goes on with the next mode.
+    """
+    results = []
+    output_file = f"{log_file}.out"
+    for mode in modes:
+        runs = []
+        for _ in range(repeat):
+            result, exit_code = measure(mode, log_file, output_file, workers)
+            if result is None:
+                break
+            runs.append(result)
+        if result is None:
+            # A negative exit code is the signal that killed the process, e.g. -9 from the OOM killer
+            results.append({'mode': mode, 'failed': True, 'exit_code': exit_code})
+            print(f"{mode:<14} failed: process exited with code {exit_code}")
+            continue
+        wall_time, matches, peak_rss, workers_peak_rss = min(runs, key=lambda run: run[0])
+        results.append({
+            'mode': mode,
+            'failed': False,
+            'wall_time_s': round(wall_time, 4),
+            'mb_per_s': round(size / (1024 * 1024) / wall_time, 2),
+            'lines_per_s': round(lines / wall_time),
+            'matches': matches,
+            'peak_rss_mb': None if peak_rss is None else round(peak_rss, 1),
+            'workers_peak_rss_mb': None if workers_peak_rss is None else round(workers_peak_rss, 1),
+        })
+        print(f"{mode:<14} {wall_time:9.3f} s {results[-1]['mb_per_s']:10.2f} MB/s "
+              f"{results[-1]['lines_per_s']:12} lines/s  peak RSS: {results[-1]['peak_rss_mb']} MB")
+    if os.path.exists(output_file):
+        os.remove(output_file)
+    return results
+
+def compare_results(results, previous_file):
+    """Prints the change in throughput of each mode compared to a previously saved results file."""
+    try:
+        with open(previous_file, 'r', encoding='utf-8') as f:
+            previous = {result['mode']: result for result in json.load(f)['results']}
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error reading results file {previous_file}: {e}")
+        return
+    print(f"\nCompared to {previous_file}:")
+    for result in results:
+        before = previous.get(result['mode'])
+        if result['failed'] or (before and before.get('failed')):
+            print(f"{result['mode']:<14} not compared, failed in one of the runs")
+        elif before:
+            change = (result['mb_per_s'] / before['mb_per_s'] - 1) * 100
+            print(f"{result['mode']:<14} {before['mb_per_s']:10.2f} -> {result['mb_per_s']:10.2f} MB/s ({change:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark log_filter on a deterministic synthetic log file')
+    parser.add_argument('--size_mb', type=float, default=256, help='Size of the synthetic log in MiB (default: 256)')
+    parser.add_argument('--line_length', type=int, default=120, help='Average line length in bytes (default: 120)')
+    parser.add_argument('--density', type=float, default=0.01,
+                        help='Fraction of lines that match the search string (default: 0.01)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the log generator (default: 0)')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES, help='Modes to benchmark (default: all)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Worker processes for the parallel mode (default: number of CPUs)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per mode, the fastest is reported (default: 3)')
+    parser.add_argument('--log_file', help='Keep the synthetic log at this path instead of a temporary directory')
+    parser.add_argument('--results', help='Results JSON file (default: benchmark_<timestamp>.json)')
+    parser.add_argument('--compare', help='Previous results JSON file to compare against')
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        log_file = os.path.abspath(args.log_file) if args.log_file else os.path.join(temp_dir, 'synthetic.log')
+        print(f"Generating {args.size_mb} MiB synthetic log: {log_file}")
+        lines = generate_log(log_file, size, args.line_length, args.density, args.seed)
+        size = os.path.getsize(log_file)
+        print(f"{lines} lines, {size} bytes\n")
+        results = run_benchmark(log_file, size, lines, args.modes, args.workers, args.repeat)
+
+    report = {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': {
+            'size_bytes': size,
+            'lines': lines,
+            'line_length': args.line_length,
+            'density': args.density,
+            'seed': args.seed,
+            'workers': args.workers,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    results_file = args.results or f"benchmark_{datetime.datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(results_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {results_file}")
+
+    if args.compare:
+        compare_results(results, args.compare)
+
+if __name__ == "__main__":
+    main()
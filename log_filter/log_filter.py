@@ -1,52 +1,880 @@
 import os
+import re
+import bz2
+import glob
+import gzip
+import json
+import lzma
+import bisect
+import hashlib
 import argparse
+import datetime
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
 
-def filter_log(input_file, output_file, search_string):
+# Number of bytes read from the input file per block in streaming mode.
+DEFAULT_BLOCK_SIZE = 8 * 1024 * 1024
+# Size of the byte range handed to a single worker in parallel mode.
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+# Number of bytes at the start of the input hashed to recognise the same file across runs.
+FINGERPRINT_SIZE = 1024
+# Openers for compressed inputs, chosen by file extension. Other files are read as is.
+COMPRESSED_OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+# Default strptime format of the timestamps used by the time index.
+DEFAULT_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Default distance in bytes between two entries of the time index.
+DEFAULT_INDEX_INTERVAL = 1024 * 1024
+# Number of bytes at the start of each line searched for a timestamp.
+TIME_SEARCH_WINDOW = 256
+# Regexes matching the text of each strptime directive supported in time formats.
+TIME_DIRECTIVE_PATTERNS = {
+    'Y': r'\d{4}', 'y': r'\d{2}', 'm': r'\d{1,2}', 'd': r'\d{1,2}', 'j': r'\d{1,3}',
+    'H': r'\d{1,2}', 'I': r'\d{1,2}', 'M': r'\d{1,2}', 'S': r'\d{1,2}', 'f': r'\d{1,6}',
+    'b': r'[A-Za-z]{3}', 'h': r'[A-Za-z]{3}', 'B': r'[A-Za-z]+', 'a': r'[A-Za-z]{3}', 'A': r'[A-Za-z]+',
+    'p': r'[AaPp][Mm]', 'z': r'(?:Z|[+-]\d{2}:?\d{2})', '%': '%',
+}
+# Regex syntax whose meaning depends on the rest of the pattern: backreferences, conditionals,
+# named groups and global inline flags. Patterns using it are not merged with other patterns.
+UNMERGEABLE_REGEX = re.compile(rb'\\[1-9]|\(\?P[<=]|\(\?\(|\(\?[aiLmsux]+\)')
+
+def compile_pattern(text, is_regex=False):
     """
-    Filters lines containing the search_string from input_file and writes them to output_file.
+    Returns the matcher for a single pattern: the UTF-8 encoded literal, or a compiled bytes regex.
+
+    Parameters:
+    - text (str): The literal string or regular expression.
+    - is_regex (bool): Whether text is a regular expression.
+    """
+    if is_regex:
+        return re.compile(text.encode('utf-8'), re.MULTILINE)
+    return text.encode('utf-8')
+
+def is_mergeable(matcher):
+    """Returns True if the matcher means the same inside an alternation with other patterns."""
+    return isinstance(matcher, bytes) or not UNMERGEABLE_REGEX.search(matcher.pattern)
+
+def combine_matchers(matchers):
+    """
+    Returns one matcher that finds every line matched by any of the given matchers.
+
+    Several patterns are merged into a single alternation regex, so each block is searched only once
+    no matter how many patterns there are. A single literal is returned as is, keeping the fast
+    bytes.find() path. Regexes using backreferences, conditionals, named groups or global inline
+    flags would change meaning or fail to compile inside the alternation, so they are kept apart and
+    the result is a tuple of matchers, each searching the same block.
+    """
+    if len(matchers) == 1:
+        return matchers[0]
+    mergeable = [m for m in matchers if is_mergeable(m)]
+    combined = [m for m in matchers if not is_mergeable(m)]
+    if len(mergeable) == 1:
+        combined.insert(0, mergeable[0])
+    elif mergeable:
+        sources = [m.pattern if isinstance(m, re.Pattern) else re.escape(m) for m in mergeable]
+        combined.insert(0, re.compile(b'|'.join(b'(?:' + source + b')' for source in sources), re.MULTILINE))
+    return combined[0] if len(combined) == 1 else tuple(combined)
+
+def line_matches(matcher, line):
+    """Returns True if the line matches the literal or regex matcher."""
+    if isinstance(matcher, bytes):
+        return matcher in line
+    return matcher.search(line) is not None
+
+def find_matching_lines(data, matcher):
+    """
+    Returns the lines of data that match, each line including its trailing newline.
+
+    Parameters:
+    - data (bytes): One or more complete lines.
+    - matcher (bytes, re.Pattern or tuple): The byte string or compiled regex to search for,
+      or a tuple of them from combine_matchers() matching lines that any of them matches.
+    """
+    if isinstance(matcher, tuple):
+        # Lines matched by several of the matchers are kept once, in their original order
+        spans = sorted({span for single in matcher for span in find_line_spans(data, single)})
+    else:
+        spans = find_line_spans(data, matcher)
+    return [data[start:end] for start, end in spans]
+
+def find_line_spans(data, matcher):
+    """
+    Returns the (start, end) offsets in data of the lines that match a single matcher.
+
+    Instead of splitting data into lines, the search jumps from one match to the next
+    and only then looks up the boundaries of the surrounding line.
+    """
+    spans = []
+    pos = 0
+    end = len(data)
+    literal = isinstance(matcher, bytes)
+    while pos < end:
+        if literal:
+            hit = data.find(matcher, pos)
+            if hit == -1:
+                break
+            hit_end = hit + len(matcher)
+        else:
+            match = matcher.search(data, pos)
+            if match is None:
+                break
+            hit, hit_end = match.span()
+        if hit >= end:
+            break
+        line_start = data.rfind(b'\n', pos, hit) + 1 or pos
+        line_end = data.find(b'\n', hit)
+        line_end = end if line_end == -1 else line_end + 1
+        # A match running past the end of the line does not count, but a regex may still
+        # match somewhere else within the line
+        if hit_end <= line_end or (not literal and matcher.search(data, line_start, line_end)):
+            spans.append((line_start, line_end))
+        pos = line_end
+    return spans
+
+def collect_matches(lines, matchers):
+    """
+    Packs the matching lines of a block into a (data, count, pattern_data, pattern_counts) tuple.
+
+    data and count cover every matching line, pattern_data and pattern_counts hold the lines
+    and the number of lines matched by each of the matchers.
+    """
+    data = b''.join(lines)
+    if len(matchers) == 1:
+        return data, len(lines), [data], [len(lines)]
+    per_pattern = [[] for _ in matchers]
+    for line in lines:
+        for index, matcher in enumerate(matchers):
+            if line_matches(matcher, line):
+                per_pattern[index].append(line)
+    return data, len(lines), [b''.join(p) for p in per_pattern], [len(p) for p in per_pattern]
+
+def iter_matching_blocks(infile, matcher, block_size=DEFAULT_BLOCK_SIZE, limit=None, terminate_last_line=False):
+    """
+    Reads a binary file object in blocks and yields the list of matching lines found in each block.
+
+    A line split across two blocks is carried over to the next one, so only the current block
+    and the matches found in it are held in memory at any time.
+
+    Parameters:
+    - infile (file object): Input file opened in binary mode.
+    - matcher (bytes, re.Pattern or tuple): The matcher returned by combine_matchers().
+    - block_size (int): Number of bytes to read per block.
+    - limit (int): Maximum number of bytes to read from infile (default: read until EOF).
+    - terminate_last_line (bool): Add a newline to a matching last line that has none, so that the
+      output of several files can be concatenated.
+    """
+    tail = b''
+    remaining = limit
+    while True:
+        if remaining is None:
+            block = infile.read(block_size)
+        else:
+            block = infile.read(min(block_size, remaining))
+            remaining -= len(block)
+        if not block:
+            break
+        cut = block.rfind(b'\n') + 1
+        if cut == 0:
+            # No line ends in this block, keep collecting until one does
+            tail += block
+            continue
+        data = tail + block[:cut] if tail else block[:cut]
+        tail = block[cut:]
+        yield find_matching_lines(data, matcher)
+    if tail:
+        matches = find_matching_lines(tail, matcher)
+        if matches and terminate_last_line and not matches[-1].endswith(b'\n'):
+            matches[-1] += b'\n'
+        yield matches
+
+def is_compressed(input_file):
+    """Returns True if input_file is read through one of the COMPRESSED_OPENERS."""
+    return os.path.splitext(input_file)[1].lower() in COMPRESSED_OPENERS
+
+def open_input(input_file):
+    """Opens input_file for binary reading, decompressing it on the fly if needed."""
+    opener = COMPRESSED_OPENERS.get(os.path.splitext(input_file)[1].lower(), open)
+    return opener(input_file, 'rb')
+
+def write_matches(results, outfile, pattern_files):
+    """
+    Writes collect_matches() tuples to outfile and to the per-pattern files.
+
+    Parameters:
+    - results (iterable): collect_matches() tuples.
+    - outfile (file object): Binary file receiving every matching line.
+    - pattern_files (list): Binary file for each pattern, or None for patterns without their own output.
+
+    Returns (count, pattern_counts).
+    """
+    count = 0
+    pattern_counts = [0] * len(pattern_files)
+    for data, matched, pattern_data, pattern_matched in results:
+        outfile.write(data)
+        count += matched
+        for index, pattern_file in enumerate(pattern_files):
+            pattern_counts[index] += pattern_matched[index]
+            if pattern_file:
+                pattern_file.write(pattern_data[index])
+    return count, pattern_counts
+
+def iter_line_ranges(input_file, chunk_size, start=0, size=None):
+    """
+    Splits input_file into consecutive (start, end) byte ranges of roughly chunk_size bytes.
+
+    Every range except the last ends right after a newline, so no line is split between two ranges.
 
     Parameters:
     - input_file (str): Path to the input log file.
-    - output_file (str): Path to the output file to save filtered lines.
-    - search_string (str): The string to search for in each line.
+    - chunk_size (int): Target size of each range in bytes.
+    - start (int): Offset of the first byte to cover (must be the start of a line).
+    - size (int): Offset just past the last byte to cover (default: the size of the file).
+    """
+    if size is None:
+        size = os.path.getsize(input_file)
+    with open(input_file, 'rb') as infile:
+        while start < size:
+            end = start + chunk_size
+            if end < size:
+                # Extend the range up to and including the next newline
+                infile.seek(end - 1)
+                infile.readline()
+                end = infile.tell()
+            else:
+                end = size
+            yield start, end
+            start = end
+
+def iter_file_matches(input_file, matchers, block_size=DEFAULT_BLOCK_SIZE, start=0, end=None):
+    """
+    Streams the byte range [start, end) of input_file in the current process and yields
+    the collect_matches() tuple of each block. By default the whole file is read.
+    """
+    matcher = combine_matchers(matchers)
+    with open(input_file, 'rb') as infile:
+        infile.seek(start)
+        limit = None if end is None else end - start
+        for matches in iter_matching_blocks(infile, matcher, block_size, limit=limit):
+            yield collect_matches(matches, matchers)
+
+def scan_range(input_file, start, end, matchers, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Scans the byte range [start, end) of input_file and returns its collect_matches() tuple.
+
+    This is the unit of work run by each worker process in parallel mode.
+    """
+    matcher = combine_matchers(matchers)
+    lines = []
+    with open(input_file, 'rb') as infile:
+        infile.seek(start)
+        for matches in iter_matching_blocks(infile, matcher, block_size, limit=end - start):
+            lines.extend(matches)
+    return collect_matches(lines, matchers)
+
+def iter_parallel_matches(input_file, matchers, workers, chunk_size=DEFAULT_CHUNK_SIZE, block_size=DEFAULT_BLOCK_SIZE,
+                          start=0, end=None):
+    """
+    Scans the byte range [start, end) of input_file with a pool of worker processes and yields
+    the collect_matches() tuple of each chunk, in the original order of the chunks.
+
+    Only a bounded number of ranges are in flight at once, so memory stays flat for huge inputs.
+
+    Parameters:
+    - input_file (str): Path to the input log file.
+    - matchers (list): Matchers returned by compile_pattern().
+    - workers (int): Number of worker processes.
+    - chunk_size (int): Size of the byte range handed to a worker.
+    - block_size (int): Number of bytes a worker reads per block.
+    - start (int): Offset of the first byte to scan.
+    - end (int): Offset just past the last byte to scan (default: the size of the file).
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for range_start, range_end in iter_line_ranges(input_file, chunk_size, start, end):
+            pending.append(pool.submit(scan_range, input_file, range_start, range_end, matchers, block_size))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def scan_file(input_file, matchers, part_prefix, pattern_outputs, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Streams one whole, possibly compressed, input file and writes its matches to temporary part files.
+
+    This is the unit of work run by each worker process when several files are scanned in parallel.
+    Returns (part_file, pattern_part_files, count, pattern_counts).
+
+    Parameters:
+    - input_file (str): Path to the input log file.
+    - matchers (list): Matchers returned by compile_pattern().
+    - part_prefix (str): Path prefix of the part files to create.
+    - pattern_outputs (list): For each pattern, whether its matches need a part file of their own.
+    - block_size (int): Number of bytes to read per block.
+    """
+    matcher = combine_matchers(matchers)
+    part_file = f"{part_prefix}.part"
+    pattern_part_files = [f"{part_prefix}.{index}.part" if keep else None
+                          for index, keep in enumerate(pattern_outputs)]
+    with ExitStack() as stack:
+        infile = stack.enter_context(open_input(input_file))
+        outfile = stack.enter_context(open(part_file, 'wb', buffering=block_size))
+        pattern_files = [stack.enter_context(open(path, 'wb')) if path else None for path in pattern_part_files]
+        results = (collect_matches(matches, matchers)
+                   for matches in iter_matching_blocks(infile, matcher, block_size, terminate_last_line=True))
+        count, pattern_counts = write_matches(results, outfile, pattern_files)
+    return part_file, pattern_part_files, count, pattern_counts
+
+def iter_part_blocks(part_file, block_size=DEFAULT_BLOCK_SIZE):
+    """Yields the contents of a part file in blocks of block_size bytes."""
+    with open(part_file, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            yield block
+
+def iter_multi_file_matches(input_files, matchers, workers=1, block_size=DEFAULT_BLOCK_SIZE,
+                            pattern_outputs=None, temp_dir=None):
+    """
+    Streams several, possibly compressed, input files and yields collect_matches() tuples
+    holding their matches in the order of input_files.
+
+    With more than one worker, whole files are scanned in parallel. Each worker writes its matches to
+    part files in a temporary directory, which are streamed back in order, so memory stays flat
+    no matter how many lines match.
+
+    Parameters:
+    - input_files (list): Paths of the input log files.
+    - matchers (list): Matchers returned by compile_pattern().
+    - workers (int): Number of worker processes (1 scans the files one by one in the current process).
+    - block_size (int): Number of bytes to read per block.
+    - pattern_outputs (list): For each pattern, whether its matches are written to a file of their own.
+    - temp_dir (str): Directory in which the temporary part files are created.
+    """
+    if workers <= 1:
+        matcher = combine_matchers(matchers)
+        for input_file in input_files:
+            with open_input(input_file) as infile:
+                for matches in iter_matching_blocks(infile, matcher, block_size, terminate_last_line=True):
+                    yield collect_matches(matches, matchers)
+        return
+
+    if pattern_outputs is None:
+        pattern_outputs = [False] * len(matchers)
+    no_data = [b''] * len(matchers)
+    no_hits = [0] * len(matchers)
+    with tempfile.TemporaryDirectory(dir=temp_dir) as part_dir, ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(scan_file, input_file, matchers, os.path.join(part_dir, str(index)),
+                               pattern_outputs, block_size)
+                   for index, input_file in enumerate(input_files)]
+        for future in futures:
+            part_file, pattern_part_files, count, pattern_counts = future.result()
+            for block in iter_part_blocks(part_file, block_size):
+                yield block, 0, no_data, no_hits
+            os.remove(part_file)
+            for index, pattern_part_file in enumerate(pattern_part_files):
+                if pattern_part_file:
+                    for block in iter_part_blocks(pattern_part_file, block_size):
+                        pattern_data = list(no_data)
+                        pattern_data[index] = block
+                        yield b'', 0, pattern_data, no_hits
+                    os.remove(pattern_part_file)
+            yield b'', count, no_data, pattern_counts
+
+def last_line_end(input_file, start, end, block_size=64 * 1024):
+    """
+    Returns the offset just past the last newline in the byte range [start, end) of input_file,
+    or start if the range holds no complete line. The range is searched backwards from end.
+    """
+    with open(input_file, 'rb') as infile:
+        pos = end
+        while pos > start:
+            read_start = max(start, pos - block_size)
+            infile.seek(read_start)
+            newline = infile.read(pos - read_start).rfind(b'\n')
+            if newline != -1:
+                return read_start + newline + 1
+            pos = read_start
+    return start
+
+def file_fingerprint(input_file, length):
+    """Returns the SHA-1 hex digest of the first length bytes of input_file."""
+    with open(input_file, 'rb') as infile:
+        return hashlib.sha1(infile.read(length)).hexdigest()
+
+def load_state_file(state_file):
+    """
+    Reads a checkpoint or index saved by a previous run. Returns None if there is no usable state file.
     """
     try:
-        with open(input_file, 'r', encoding='utf-8') as infile:
-            # Read all lines from the input file
-            lines = infile.readlines()
-        
-        # Filter lines that contain the search string
-        filtered_lines = [line for line in lines if search_string in line]
-        
-        # Write the filtered lines to the output file
-        with open(output_file, 'w', encoding='utf-8') as outfile:
-            outfile.writelines(filtered_lines)
-        
-        print(f"Filtering complete. {len(filtered_lines)} lines written to '{output_file}'.")
-    
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
     except FileNotFoundError:
-        print(f"Error: The file '{input_file}' does not exist in the current directory.")
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Warning: Ignoring unreadable state file '{state_file}': {e}")
+        return None
+
+def save_state_file(state_file, state):
+    """
+    Writes a checkpoint or index to a temporary file first and then moves it into place,
+    so an interrupted run never leaves a half-written state file behind.
+    """
+    temp_file = f"{state_file}.tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(temp_file, state_file)
+
+def file_state(input_file, stat, offset):
+    """
+    Returns the state recorded for input_file once its first offset bytes have been processed:
+    the offset itself plus the inode, device and a fingerprint of the first bytes of the file.
+    """
+    fingerprint_size = min(FINGERPRINT_SIZE, offset)
+    return {
+        'offset': offset,
+        'inode': stat.st_ino,
+        'device': stat.st_dev,
+        'fingerprint_size': fingerprint_size,
+        'fingerprint': file_fingerprint(input_file, fingerprint_size),
+    }
+
+def detect_file_change(input_file, stat, state):
+    """
+    Returns a message describing why input_file is no longer the file described by a file_state() dict,
+    or None if the file has only grown since then.
+
+    Parameters:
+    - input_file (str): Path to the input log file.
+    - stat (os.stat_result): Current stat of input_file.
+    - state (dict): State saved by a previous run.
+    """
+    if (stat.st_ino, stat.st_dev) != (state['inode'], state['device']):
+        return "Log rotation detected"
+    if stat.st_size < state['offset']:
+        return "Log truncation detected"
+    if file_fingerprint(input_file, state['fingerprint_size']) != state['fingerprint']:
+        return "Log file was rewritten"
+    return None
+
+def resume_offset(input_file, stat, checkpoint):
+    """
+    Returns the offset to resume scanning input_file from.
+
+    Scanning restarts at 0 when there is no checkpoint, or when the input was rotated (different inode),
+    truncated (smaller than the saved offset) or rewritten (first bytes no longer match).
+
+    Parameters:
+    - input_file (str): Path to the input log file.
+    - stat (os.stat_result): Current stat of input_file.
+    - checkpoint (dict): Checkpoint saved by the previous run, or None.
+    """
+    if not checkpoint:
+        return 0
+    change = detect_file_change(input_file, stat, checkpoint)
+    if change:
+        print(f"{change}, scanning the file from the beginning.")
+        return 0
+    return checkpoint['offset']
+
+def time_format_regex(time_format):
+    """
+    Translates a strptime format into a compiled regex that finds such timestamps in a line.
+
+    Raises ValueError for directives missing from TIME_DIRECTIVE_PATTERNS.
+    """
+    parts = []
+    index = 0
+    while index < len(time_format):
+        char = time_format[index]
+        if char == '%' and index + 1 < len(time_format):
+            directive = time_format[index + 1]
+            if directive not in TIME_DIRECTIVE_PATTERNS:
+                raise ValueError(f"Unsupported directive '%{directive}' in time format '{time_format}'")
+            parts.append(TIME_DIRECTIVE_PATTERNS[directive])
+            index += 2
+        else:
+            parts.append(re.escape(char))
+            index += 1
+    return re.compile(''.join(parts))
+
+def time_key(timestamp):
+    """
+    Returns a datetime as seconds since 1970-01-01. Naive datetimes are taken as is and aware ones
+    are converted to UTC, so formats without a year or time zone still compare correctly.
+    """
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return (timestamp - datetime.datetime(1970, 1, 1)).total_seconds()
+
+def parse_line_time(line, time_regex, time_format):
+    """
+    Returns the time_key() of the first timestamp within the first TIME_SEARCH_WINDOW bytes of line,
+    or None if the line has no timestamp (e.g. a continuation line of a stack trace).
+    """
+    match = time_regex.search(line[:TIME_SEARCH_WINDOW].decode('utf-8', 'replace'))
+    if match is None:
+        return None
+    try:
+        return time_key(datetime.datetime.strptime(match.group(0), time_format))
+    except ValueError:
+        return None
+
+def parse_time_argument(value, time_format):
+    """
+    Parses a --since/--until value given either in time_format or in ISO 8601 format.
+    """
+    try:
+        return time_key(datetime.datetime.strptime(value, time_format))
+    except ValueError:
+        return time_key(datetime.datetime.fromisoformat(value))
+
+def update_time_index(input_file, index_file, time_format=DEFAULT_TIME_FORMAT, interval=DEFAULT_INDEX_INTERVAL):
+    """
+    Creates or extends the sidecar time index of input_file and returns it.
+
+    The index is a sparse list of (timestamp, offset) entries, one for the first timestamped line
+    found after every interval bytes. Building it only reads a few lines per interval, and later
+    calls only index the bytes appended since. The index is rebuilt from scratch if the time format
+    or interval changed, or if the log was rotated, truncated or rewritten.
+    Timestamps are assumed to be non-decreasing through the file, as they are in append-only logs.
+
+    Parameters:
+    - input_file (str): Path to the input log file.
+    - index_file (str): Path of the sidecar index file.
+    - time_format (str): strptime format of the timestamps in the log.
+    - interval (int): Distance in bytes between two index entries.
+    """
+    time_regex = time_format_regex(time_format)
+    stat = os.stat(input_file)
+    index = load_state_file(index_file)
+    if index and (index['time_format'], index['interval']) != (time_format, interval):
+        index = None
+    if index:
+        change = detect_file_change(input_file, stat, index)
+        if change:
+            print(f"{change}, rebuilding the time index.")
+            index = None
+    entries = index['entries'] if index else []
+    target = index['next_offset'] if index else 0
+    end = last_line_end(input_file, index['offset'] if index else 0, stat.st_size)
+
+    with open(input_file, 'rb') as infile:
+        while target < end:
+            # Move to the start of the first line at or after the target offset
+            infile.seek(max(target - 1, 0))
+            if target > 0:
+                infile.readline()
+            line_start = infile.tell()
+            while line_start < end:
+                line = infile.readline()
+                timestamp = parse_line_time(line, time_regex, time_format)
+                if timestamp is not None:
+                    entries.append((timestamp, line_start))
+                    break
+                line_start += len(line)
+            target = max(target + interval, infile.tell())
+
+    index = file_state(input_file, stat, end)
+    index.update({'time_format': time_format, 'interval': interval, 'next_offset': target, 'entries': entries})
+    save_state_file(index_file, index)
+    return index
+
+def first_line_after(input_file, start, end, time_regex, time_format, threshold, inclusive):
+    """
+    Returns the offset of the first line in [start, end) whose timestamp is at or after threshold
+    (strictly after it if inclusive is False), or end if there is none.
+    """
+    with open(input_file, 'rb') as infile:
+        infile.seek(start)
+        pos = start
+        while pos < end:
+            line = infile.readline()
+            if not line:
+                break
+            timestamp = parse_line_time(line, time_regex, time_format)
+            if timestamp is not None and (timestamp >= threshold if inclusive else timestamp > threshold):
+                return pos
+            pos += len(line)
+    return end
+
+def time_window_range(input_file, index, since=None, until=None):
+    """
+    Returns the (start, end) byte range of input_file holding the lines timestamped between since and until.
+
+    The index narrows each boundary down to one interval with a binary search, and only that
+    interval is read line by line to find the exact boundary. Lines without a timestamp belong
+    to the timestamped line before them.
+
+    Parameters:
+    - input_file (str): Path to the input log file.
+    - index (dict): Time index returned by update_time_index().
+    - since (float): time_key() of the start of the window, or None for the start of the file.
+    - until (float): time_key() of the end of the window (inclusive), or None for the end of the file.
+    """
+    time_regex = time_format_regex(index['time_format'])
+    entries = index['entries']
+    times = [timestamp for timestamp, _ in entries]
+    file_end = index['offset']
+
+    def entry_span(position):
+        # Byte range covered by the entry at position, from its offset to the next entry
+        span_start = entries[position][1] if position >= 0 else 0
+        span_end = entries[position + 1][1] if position + 1 < len(entries) else file_end
+        return span_start, span_end
+
+    start, end = 0, file_end
+    if since is not None:
+        span_start, span_end = entry_span(bisect.bisect_left(times, since) - 1)
+        start = first_line_after(input_file, span_start, span_end, time_regex, index['time_format'], since, True)
+    if until is not None:
+        span_start, span_end = entry_span(bisect.bisect_right(times, until) - 1)
+        end = first_line_after(input_file, max(span_start, start), span_end, time_regex,
+                               index['time_format'], until, False)
+    return start, max(start, end)
+
+def pattern_label(text, is_regex):
+    """Returns how a pattern is shown in the summary."""
+    return f"re:{text}" if is_regex else text
+
+def filter_log(input_file, output_file, search_string=None, block_size=DEFAULT_BLOCK_SIZE,
+               workers=1, chunk_size=DEFAULT_CHUNK_SIZE, patterns=None, checkpoint_file=None,
+               since=None, until=None, index_file=None, time_format=DEFAULT_TIME_FORMAT,
+               index_interval=DEFAULT_INDEX_INTERVAL):
+    """
+    Filters lines containing the search_string from input_file and writes them to output_file.
+
+    input_file may also be a list of files, which are scanned in order (in parallel with several workers)
+    into the same output. Files ending in .gz, .bz2 or .xz are decompressed on the fly.
+
+    The input is streamed in blocks of block_size bytes, so memory usage stays flat regardless
+    of the size of the input file. Matching lines are written out byte for byte.
+    With more than one worker, the input is split into newline-aligned ranges of chunk_size bytes
+    that are scanned in a process pool and written out in their original order.
+    Several patterns can be matched in the same single pass; each of them reports its own hit count
+    and can write its matches to its own output file.
+    With a checkpoint file, only the bytes appended since the previous run are scanned and the
+    matches are appended to the output files. An incomplete last line is left for the next run.
+    With since and/or until, a sidecar time index is used to read only the bytes of that time window.
+
+    Parameters:
+    - input_file (str or list): Path to the input log file, or a list of paths.
+    - output_file (str): Path to the output file to save lines matching any pattern.
+    - search_string (str): The string to search for in each line.
+    - block_size (int): Number of bytes to read from the input file per block.
+    - workers (int): Number of worker processes (1 scans the file in the current process).
+    - chunk_size (int): Size of the byte range handed to a worker in parallel mode.
+    - patterns (list): (text, is_regex, pattern_output_file) tuples to search for instead of
+      search_string. pattern_output_file may be None.
+    - checkpoint_file (str): Path of the file storing the offset reached by the previous run.
+      Only supported for a single uncompressed input file.
+    - since (str): Only scan lines timestamped at or after this time (in time_format or ISO 8601).
+    - until (str): Only scan lines timestamped at or before this time (in time_format or ISO 8601).
+    - index_file (str): Path of the sidecar time index (default: <input_file>.tidx).
+    - time_format (str): strptime format of the timestamps in the log.
+    - index_interval (int): Distance in bytes between two time index entries.
+
+    Returns the number of matching lines, or None if filtering failed.
+    """
+    if patterns is None:
+        patterns = [(search_string, False, None)]
+    input_files = [input_file] if isinstance(input_file, str) else list(input_file)
+    single_plain_input = len(input_files) == 1 and not is_compressed(input_files[0])
+    time_window = since is not None or until is not None
+    if checkpoint_file and not single_plain_input:
+        print("Error: Incremental mode only supports a single uncompressed input file.")
+        return
+    if time_window and (checkpoint_file or not single_plain_input):
+        print("Error: Time windows only support a single uncompressed input file without incremental mode.")
+        return
+    try:
+        matchers = []
+        for text, is_regex, _ in patterns:
+            # Each pattern is checked on its own, before any of them is combined with the others
+            try:
+                matchers.append(compile_pattern(text, is_regex))
+            except re.error as e:
+                raise ValueError(f"Invalid regular expression '{text}': {e}") from e
+        # Fail before creating any output file if an input is missing
+        stats = [os.stat(path) for path in input_files]
+        if single_plain_input:
+            input_file, stat = input_files[0], stats[0]
+            start, end = 0, stat.st_size
+            if checkpoint_file:
+                start = resume_offset(input_file, stat, load_state_file(checkpoint_file))
+                end = last_line_end(input_file, start, stat.st_size)
+                print(f"Scanning bytes {start}-{end} of '{input_file}'.")
+            elif time_window:
+                index = update_time_index(input_file, index_file or f"{input_file}.tidx", time_format, index_interval)
+                since_key = None if since is None else parse_time_argument(since, time_format)
+                until_key = None if until is None else parse_time_argument(until, time_format)
+                start, end = time_window_range(input_file, index, since_key, until_key)
+                print(f"Scanning bytes {start}-{end} of '{input_file}'.")
+            if workers > 1:
+                results = iter_parallel_matches(input_file, matchers, workers, chunk_size, block_size, start, end)
+            else:
+                results = iter_file_matches(input_file, matchers, block_size, start, end)
+        else:
+            pattern_outputs = [bool(path) for _, _, path in patterns]
+            results = iter_multi_file_matches(input_files, matchers, workers, block_size, pattern_outputs,
+                                              temp_dir=os.path.dirname(output_file) or None)
+
+        mode = 'ab' if checkpoint_file else 'wb'
+        with ExitStack() as stack:
+            outfile = stack.enter_context(open(output_file, mode, buffering=block_size))
+            pattern_files = [stack.enter_context(open(path, mode)) if path else None for _, _, path in patterns]
+            count, pattern_counts = write_matches(results, outfile, pattern_files)
+
+        if checkpoint_file:
+            # Only saved once the matches are safely written, so a failed run is simply repeated
+            save_state_file(checkpoint_file, file_state(input_file, stat, end))
+
+        if single_plain_input:
+            print(f"Filtering complete. {count} lines written to '{output_file}'.")
+        else:
+            print(f"Filtering complete. {count} lines from {len(input_files)} files written to '{output_file}'.")
+        if len(patterns) > 1 or patterns[0][2]:
+            for (text, is_regex, path), matched in zip(patterns, pattern_counts):
+                destination = f" written to '{path}'" if path else ""
+                print(f"  {pattern_label(text, is_regex)}: {matched} lines{destination}")
+        return count
+
+    except FileNotFoundError as e:
+        print(f"Error: The file '{e.filename}' does not exist in the current directory.")
+    except re.error as e:
+        print(f"Error: Invalid regular expression: {e}")
+    except ValueError as e:
+        print(f"Error: {e}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
 
+def load_pattern_file(pattern_file):
+    """
+    Reads patterns from pattern_file and returns them as (text, is_regex, pattern_output_file) tuples.
+
+    Each line holds one pattern. Lines starting with 're:' are regular expressions, all other lines
+    are literal strings. A pattern may be followed by a tab and the file its matches are written to.
+    Empty lines and lines starting with '#' are skipped.
+    """
+    patterns = []
+    with open(pattern_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            if not line or line.startswith('#'):
+                continue
+            text, _, path = line.partition('\t')
+            is_regex = text.startswith('re:')
+            if is_regex:
+                text = text[3:]
+            patterns.append((text, is_regex, path or None))
+    return patterns
+
+def expand_inputs(inputs, current_dir):
+    """
+    Resolves the --input arguments relative to current_dir and expands glob patterns.
+
+    Paths without wildcards are kept as given, so a missing file is reported by filter_log.
+    A glob pattern matching nothing is kept as well, for the same reason.
+    """
+    input_files = []
+    for pattern in inputs:
+        path = os.path.join(current_dir, pattern)
+        if any(char in pattern for char in '*?['):
+            input_files.extend(sorted(glob.glob(path)) or [path])
+        else:
+            input_files.append(path)
+    return input_files
+
 def main():
     # Set up argument parser
     parser = argparse.ArgumentParser(description='Filter log files based on search string')
-    parser.add_argument('--search_str', required=True, help='String to search for in log file')
-    parser.add_argument('--input', default='log.txt', help='Input log filename (default: log.txt)')
+    parser.add_argument('--search_str', action='append', default=[],
+                        help='String to search for in log file (can be given several times)')
+    parser.add_argument('--regex', action='append', default=[],
+                        help='Regular expression to search for in log file (can be given several times)')
+    parser.add_argument('--pattern_file',
+                        help="File with one pattern per line ('re:' prefix for regexes, optional tab + output file)")
+    parser.add_argument('--split_outputs', action='store_true',
+                        help='Also write the matches of each pattern to its own file next to the output file')
+    parser.add_argument('--input', nargs='+', default=['log.txt'],
+                        help='Input log filenames or glob patterns, .gz/.bz2/.xz are decompressed on the fly (default: log.txt)')
     parser.add_argument('--output', default='filtered_log.txt', help='Output filename (default: filtered_log.txt)')
-    
+    parser.add_argument('--block_size', type=int, default=DEFAULT_BLOCK_SIZE,
+                        help=f'Bytes read per block while streaming the input (default: {DEFAULT_BLOCK_SIZE})')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker processes used to scan the input in parallel (default: 1)')
+    parser.add_argument('--chunk_size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f'Bytes handed to each worker in parallel mode (default: {DEFAULT_CHUNK_SIZE})')
+    parser.add_argument('--follow', action='store_true',
+                        help='Only scan lines appended since the previous run and append the matches to the output')
+    parser.add_argument('--checkpoint',
+                        help='Checkpoint file used by --follow (default: <output>.checkpoint); implies --follow')
+    parser.add_argument('--since', help='Only scan lines timestamped at or after this time (uses the time index)')
+    parser.add_argument('--until', help='Only scan lines timestamped at or before this time (uses the time index)')
+    parser.add_argument('--build_index', action='store_true',
+                        help='Create or update the time index of the input file and exit')
+    parser.add_argument('--index_file', help='Sidecar time index file (default: <input>.tidx)')
+    parser.add_argument('--time_format', default=DEFAULT_TIME_FORMAT,
+                        help="strptime format of the log timestamps (default: '%%Y-%%m-%%d %%H:%%M:%%S')")
+    parser.add_argument('--index_interval', type=int, default=DEFAULT_INDEX_INTERVAL,
+                        help=f'Bytes between two time index entries (default: {DEFAULT_INDEX_INTERVAL})')
+
     args = parser.parse_args()
-    
+
     # Get the current working directory
     current_dir = os.getcwd()
-    
+
     # Construct full paths
-    input_path = os.path.join(current_dir, args.input)
+    input_paths = expand_inputs(args.input, current_dir)
     output_path = os.path.join(current_dir, args.output)
-    
+
+    # Index building needs no patterns
+    index_path = os.path.join(current_dir, args.index_file) if args.index_file else None
+    if args.build_index:
+        if len(input_paths) != 1 or is_compressed(input_paths[0]):
+            parser.error('--build_index needs a single uncompressed input file')
+        index_path = index_path or f"{input_paths[0]}.tidx"
+        try:
+            index = update_time_index(input_paths[0], index_path, args.time_format, args.index_interval)
+            print(f"Time index '{index_path}' covers {index['offset']} bytes with {len(index['entries'])} entries.")
+        except FileNotFoundError:
+            print(f"Error: The file '{input_paths[0]}' does not exist in the current directory.")
+        except ValueError as e:
+            print(f"Error: {e}")
+        return
+
+    # Collect the patterns from the command line and the pattern file
+    patterns = [(text, False, None) for text in args.search_str]
+    patterns += [(text, True, None) for text in args.regex]
+    if args.pattern_file:
+        try:
+            patterns += load_pattern_file(os.path.join(current_dir, args.pattern_file))
+        except OSError as e:
+            parser.error(f"Could not read pattern file: {e}")
+    if not patterns:
+        parser.error('at least one of --search_str, --regex or --pattern_file is required')
+
+    # Give every pattern without an output file its own numbered file next to the output file
+    output_base, output_ext = os.path.splitext(output_path)
+    for index, (text, is_regex, path) in enumerate(patterns):
+        if path:
+            patterns[index] = (text, is_regex, os.path.join(current_dir, path))
+        elif args.split_outputs:
+            patterns[index] = (text, is_regex, f"{output_base}_{index + 1}{output_ext}")
+
+    # Incremental mode keeps its progress next to the output unless told otherwise
+    checkpoint_path = None
+    if args.checkpoint:
+        checkpoint_path = os.path.join(current_dir, args.checkpoint)
+    elif args.follow:
+        checkpoint_path = f"{output_path}.checkpoint"
+
     # Call the filter function
-    filter_log(input_path, output_path, args.search_str)
+    filter_log(input_paths, output_path, block_size=args.block_size, workers=args.workers,
+               chunk_size=args.chunk_size, patterns=patterns, checkpoint_file=checkpoint_path,
+               since=args.since, until=args.until, index_file=index_path, time_format=args.time_format,
+               index_interval=args.index_interval)
 
 if __name__ == "__main__":
     main()
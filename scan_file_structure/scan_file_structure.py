@@ -1,6 +1,12 @@
 import os
+import json
+import time
+import heapq
+import itertools
 import argparse
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 try:
@@ -10,52 +16,372 @@ except ImportError:
     print("Install it using: pip install pathspec")
     sys.exit(1)
 
-def load_gitignore(root_path):
-    gitignore_path = os.path.join(root_path, '.gitignore')
-    if not os.path.isfile(gitignore_path):
-        return None  # No .gitignore file found
+# The shared directory walker lives in the repository's shared folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'shared'))
+from gitignore_walker import list_directory, filter_entries, is_walkable_dir
 
-    try:
-        with open(gitignore_path, 'r', encoding='utf-8') as f:
-            gitignore_content = f.read()
-        spec = pathspec.PathSpec.from_lines('gitwildmatch', gitignore_content.splitlines())
-        return spec
-    except Exception as e:
-        print(f"Error reading .gitignore file: {e}")
-        return None
+# Directories modified this close to the previous scan (in nanoseconds) are listed again, since a change
+# made within the same timestamp granularity would not show up as a different mtime.
+SNAPSHOT_RACE_WINDOW_NS = 2_000_000_000
+# Number of output lines collected before they are written out in one call.
+OUTPUT_BUFFER_LINES = 10000
+# Multipliers of the size suffixes accepted by --min_size and --max_size.
+SIZE_SUFFIXES = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+# Number of directory listings per --jobs thread that may be queued or held ahead of the walk.
+PREFETCH_DIRS_PER_JOB = 64
+
+class SnapshotEntry:
+    """Minimal stand-in for os.DirEntry, used for listings taken from a snapshot."""
+    __slots__ = ('name', 'path', 'dir', 'symlink')
+
+    def __init__(self, name, path, is_dir, is_symlink):
+        self.name = name
+        self.path = path
+        self.dir = is_dir
+        self.symlink = is_symlink
+
+    def is_dir(self):
+        return self.dir
+
+    def is_symlink(self):
+        return self.symlink
+
+    def stat(self, follow_symlinks=True):
+        return os.stat(self.path, follow_symlinks=follow_symlinks)
 
-def scan_directory(path, prefix, spec):
+def load_snapshot(snapshot_path, root_path):
+    """
+    Returns the snapshot saved by a previous run for root_path, or None if there is none.
+    """
     try:
-        # Retrieve and sort directory contents
-        items = sorted(os.listdir(path))
-    except PermissionError:
-        print(f"{prefix}Permission denied: {path}")
-        return
+        with open(snapshot_path, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
     except FileNotFoundError:
-        print(f"{prefix}Path not found: {path}")
-        return
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Error reading snapshot file {snapshot_path}: {e}", file=sys.stderr)
+        return None
+    if snapshot.get('root') != root_path:
+        return None
+    return snapshot
+
+def save_snapshot(snapshot_path, snapshot):
+    """Writes the snapshot through a temporary file, so an interrupted run keeps the previous one intact."""
+    temp_path = f"{snapshot_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, separators=(',', ':'))
+    os.replace(temp_path, snapshot_path)
+
+def snapshot_lister(previous, directories):
+    """
+    Returns a lister with the signature of list_directory() that reuses the listings of a previous
+    snapshot for every directory whose mtime has not changed, and records every listing it returns
+    in directories.
+
+    Listings are stored unfiltered, as [name, is_dir, is_symlink, visible] lists, so that changed
+    .gitignore rules still apply to cached directories. visible tells whether the entry passed the
+    rules of this run.
 
-    # Iterate through items with their indices
-    for index, item in enumerate(items):
-        # Skip .git folder and .gitignore file
-        if item == '.git' or item == '.gitignore':
+    Parameters:
+    - previous (dict): Snapshot saved by the previous run, or None.
+    - directories (dict): Receives the listing and mtime of each directory, keyed by relative path.
+    """
+    cached_directories = previous['directories'] if previous else {}
+    trusted_before_ns = previous['scanned_at_ns'] - SNAPSHOT_RACE_WINDOW_NS if previous else 0
+
+    def lister(dir_path, rel_path, rules_chain):
+        mtime_ns = os.stat(dir_path).st_mtime_ns
+        cached = cached_directories.get(rel_path)
+        if cached and cached['mtime_ns'] == mtime_ns and mtime_ns < trusted_before_ns:
+            entries = [SnapshotEntry(name, os.path.join(dir_path, name), is_dir, is_symlink)
+                       for name, is_dir, is_symlink, _ in cached['entries']]
+        else:
+            with os.scandir(dir_path) as it:
+                entries = [SnapshotEntry(entry.name, entry.path, entry.is_dir(), entry.is_symlink()) for entry in it]
+        kept, rules_chain = filter_entries(entries, dir_path, rel_path, rules_chain)
+        visible = {entry.name for entry in kept}
+        directories[rel_path] = {
+            'mtime_ns': mtime_ns,
+            'entries': [[entry.name, entry.dir, entry.symlink, entry.name in visible] for entry in entries],
+        }
+        return kept, rules_chain
+
+    return lister
+
+def diff_snapshots(previous, current):
+    """
+    Returns the visible entries added and removed between two snapshots as a sorted list of
+    (sign, rel_path) tuples, sign being '+' or '-'. Directories get a trailing '/', and the
+    contents of an added or removed directory are not listed separately.
+    """
+    changes = []
+    previous_directories = previous['directories']
+    for rel_path, listing in current['directories'].items():
+        old_listing = previous_directories.get(rel_path)
+        if old_listing is None:
             continue
+        old_visible = {name: is_dir for name, is_dir, _, visible in old_listing['entries'] if visible}
+        new_visible = {name: is_dir for name, is_dir, _, visible in listing['entries'] if visible}
+        for sign, names, source in (('+', new_visible.keys() - old_visible.keys(), new_visible),
+                                    ('-', old_visible.keys() - new_visible.keys(), old_visible)):
+            for name in names:
+                entry_path = f"{rel_path}/{name}" if rel_path else name
+                changes.append((sign, entry_path + ('/' if source[name] else '')))
+    changes.sort(key=lambda change: (change[1], change[0]))
+    return changes
+
+def prefetch_directory(executor, slots, dir_path, rel_path, rules_chain, lister=list_directory):
+    """
+    Lists a directory in a worker thread and right away queues the listing of its subdirectories,
+    so that many directory round-trips are in flight at once on high-latency filesystems.
+    Returns (entries, rules_chain, child_futures) where child_futures maps subdirectory names
+    to the futures of their own listings.
+    """
+    entries, rules_chain = lister(dir_path, rel_path, rules_chain)
+    return entries, rules_chain, prefetch_children(executor, slots, entries, rel_path, rules_chain, lister)
+
+def prefetch_children(executor, slots, entries, rel_path, rules_chain, lister=list_directory):
+    """
+    Queues the listing of the subdirectories among entries and returns a dict mapping their names
+    to the futures of the listings.
+
+    Every queued listing takes one of the slots (a semaphore) until the walk takes its result, which
+    caps how far the listing runs ahead of the walk and how many listings are held in memory. When no
+    slot is free, the subdirectory is left out and the walk lists it itself once it gets there, and
+    queues its children in turn, so a full budget never blocks a worker thread.
+    """
+    child_futures = {}
+    for entry in entries:
+        if is_walkable_dir(entry) and slots.acquire(blocking=False):
+            child_rel_path = f"{rel_path}/{entry.name}" if rel_path else entry.name
+            child_futures[entry.name] = executor.submit(prefetch_directory, executor, slots, entry.path,
+                                                        child_rel_path, rules_chain, lister)
+    return child_futures
+
+def take_listing(future, slots):
+    """Returns the result of a listing queued by prefetch_children() and frees its slot."""
+    try:
+        return future.result()
+    finally:
+        slots.release()
+
+def scan_directory(path, prefix="", rules_chain=(), jobs=1, lister=list_directory, emit=print):
+    """
+    Prints the tree below path, skipping .git, .gitignore and anything ignored by .gitignore files
+    (including nested ones). An explicit stack is used instead of recursion, so deep trees cannot
+    hit the recursion limit.
+
+    With more than one job, directories are listed ahead of time by a pool of threads, while the
+    tree is still printed in the same sorted order as a sequential scan, each line as soon as the
+    listing it comes from is available. At most PREFETCH_DIRS_PER_JOB listings per job are queued
+    or held ahead of the printer.
+
+    lister lists one directory (list_directory() or a snapshot_lister()), and emit receives each
+    output line.
+    """
+    frames = []
+
+    def open_directory(dir_path, rel_path, chain, dir_prefix, future=None):
+        try:
+            if future is None:
+                entries, chain = lister(dir_path, rel_path, chain)
+                child_futures = prefetch_children(executor, slots, entries, rel_path, chain, lister) if executor else {}
+            else:
+                entries, chain, child_futures = take_listing(future, slots)
+        except PermissionError:
+            emit(f"{dir_prefix}Permission denied: {dir_path}")
+            return
+        except FileNotFoundError:
+            emit(f"{dir_prefix}Path not found: {dir_path}")
+            return
+        frames.append((iter(enumerate(entries)), len(entries), rel_path, chain, dir_prefix, child_futures))
 
-        item_path = os.path.join(path, item)
-        relative_path = os.path.relpath(item_path, start=root_path)
-        
-        # Check if the item matches any ignore patterns
-        if spec and spec.match_file(relative_path):
-            continue  # Skip ignored files/directories
+    executor = ThreadPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    slots = threading.BoundedSemaphore(jobs * PREFETCH_DIRS_PER_JOB)
+    try:
+        open_directory(path, "", rules_chain, prefix)
+        while frames:
+            items, count, rel_path, chain, dir_prefix, child_futures = frames[-1]
+            item = next(items, None)
+            if item is None:
+                frames.pop()
+                continue
+
+            index, entry = item
+            is_last = index == count - 1
+            connector = "└── " if is_last else "├── "
+            emit(f"{dir_prefix}{connector}{entry.name}")
+
+            # If item is a directory, descend into it before its next sibling
+            if is_walkable_dir(entry):
+                extension = "    " if is_last else "│   "
+                child_rel_path = f"{rel_path}/{entry.name}" if rel_path else entry.name
+                open_directory(entry.path, child_rel_path, chain, dir_prefix + extension, child_futures.get(entry.name))
+    finally:
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+def scan_sizes(path, jobs=1, lister=list_directory, max_depth=None, min_size=0, max_size=None,
+               on_record=None, keep_children=False):
+    """
+    Walks the tree below path once and rolls up the size of every file into the totals of its
+    directories. File sizes come from the DirEntry of the same scandir pass, so no second walk is needed.
+
+    Each entry becomes a record dict with its path relative to path ('.' for the root), type
+    ('file', 'symlink' or 'dir'), size in bytes and depth. Directory records also count the files
+    and subdirectories below them, and their size is the total of all files below them.
+    on_record is called for every record within max_depth whose size is within [min_size, max_size],
+    children before their directory. Entries outside those limits are still counted in the totals.
+
+    Parameters:
+    - path (str): Root directory to scan.
+    - jobs (int): Number of threads listing directories ahead of time, at most PREFETCH_DIRS_PER_JOB each.
+    - lister (callable): list_directory() or a snapshot_lister().
+    - max_depth (int): Deepest level to report (the root is level 0), or None for no limit.
+    - min_size (int): Smallest size to report, in bytes.
+    - max_size (int): Largest size to report, in bytes, or None for no limit.
+    - on_record (callable): Receives each reported record.
+    - keep_children (bool): Give reported directory records a 'children' list of their reported entries.
+
+    Returns the root record.
+    """
+    def report(record, parent):
+        if max_depth is not None and record['depth'] > max_depth:
+            return
+        if record['size'] < min_size or (max_size is not None and record['size'] > max_size):
+            return
+        if on_record:
+            on_record(record)
+        if keep_children and parent is not None and 'children' in parent:
+            parent['children'].append(record)
+
+    def new_directory_record(rel_path, depth):
+        record = {'path': rel_path or '.', 'type': 'dir', 'size': 0, 'depth': depth, 'files': 0, 'dirs': 0}
+        if keep_children and (max_depth is None or depth < max_depth):
+            record['children'] = []
+        return record
+
+    frames = []
+
+    def open_directory(dir_path, rel_path, chain, record, future=None):
+        try:
+            if future is None:
+                entries, chain = lister(dir_path, rel_path, chain)
+                child_futures = prefetch_children(executor, slots, entries, rel_path, chain, lister) if executor else {}
+            else:
+                entries, chain, child_futures = take_listing(future, slots)
+        except OSError as e:
+            record['error'] = e.strerror or str(e)
+            entries, child_futures = [], {}
+        frames.append((iter(entries), rel_path, chain, record, child_futures))
+
+    root = new_directory_record("", 0)
+    executor = ThreadPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    slots = threading.BoundedSemaphore(jobs * PREFETCH_DIRS_PER_JOB)
+    try:
+        open_directory(path, "", (), root)
+        while frames:
+            items, rel_path, chain, record, child_futures = frames[-1]
+            entry = next(items, None)
+            if entry is None:
+                # The directory is complete: report it and add its totals to its parent
+                frames.pop()
+                parent = frames[-1][3] if frames else None
+                if parent is not None:
+                    parent['size'] += record['size']
+                    parent['files'] += record['files']
+                    parent['dirs'] += record['dirs'] + 1
+                report(record, parent)
+                continue
+
+            child_rel_path = f"{rel_path}/{entry.name}" if rel_path else entry.name
+            depth = record['depth'] + 1
+            if is_walkable_dir(entry):
+                open_directory(entry.path, child_rel_path, chain, new_directory_record(child_rel_path, depth),
+                               child_futures.get(entry.name))
+                continue
 
-        connector = "├── " if index < len(items) - 1 else "└── "
-        print(f"{prefix}{connector}{item}")
+            try:
+                size = entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                size = 0
+            record['size'] += size
+            record['files'] += 1
+            report({'path': child_rel_path, 'type': 'symlink' if entry.is_symlink() else 'file',
+                    'size': size, 'depth': depth}, record)
+    finally:
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+    return root
 
-        # If item is a directory, recurse into it
-        if os.path.isdir(item_path):
-            # Determine the new prefix for the next level
-            extension = "│   " if index < len(items) - 1 else "    "
-            scan_directory(item_path, prefix + extension, spec)
+def buffered_writer(stream, max_lines=OUTPUT_BUFFER_LINES):
+    """
+    Returns (write_line, flush) functions that collect output lines and write them to stream
+    max_lines at a time, instead of one write call per line.
+    """
+    lines = []
+
+    def flush():
+        if lines:
+            stream.write("\n".join(lines) + "\n")
+            lines.clear()
+
+    def write_line(line):
+        lines.append(line)
+        if len(lines) >= max_lines:
+            flush()
+
+    return write_line, flush
+
+def write_sizes(root_path, output_format, jobs=1, lister=list_directory, max_depth=None, top=None,
+                min_size=0, max_size=None, stream=sys.stdout):
+    """
+    Scans root_path with scan_sizes() and writes the records as JSON Lines ('jsonl', children before
+    their directory) or as one compact nested JSON tree ('json'). With top, only the top largest
+    records are written, largest first ('json' then writes them as a list).
+    """
+    write_line, flush = buffered_writer(stream)
+
+    def dump(record):
+        return json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+
+    if top:
+        largest = []
+        sequence = itertools.count()
+
+        def keep_largest(record):
+            # The sequence number breaks size ties, so the record dicts are never compared
+            item = (record['size'], -next(sequence), record)
+            if len(largest) < top:
+                heapq.heappush(largest, item)
+            else:
+                heapq.heappushpop(largest, item)
+
+        scan_sizes(root_path, jobs, lister, max_depth, min_size, max_size, on_record=keep_largest)
+        records = [record for _, _, record in sorted(largest, reverse=True)]
+        if output_format == 'json':
+            write_line(json.dumps(records, ensure_ascii=False, separators=(',', ':')))
+        else:
+            for record in records:
+                write_line(dump(record))
+    elif output_format == 'json':
+        root = scan_sizes(root_path, jobs, lister, max_depth, min_size, max_size, keep_children=True)
+        write_line(dump(root))
+    else:
+        scan_sizes(root_path, jobs, lister, max_depth, min_size, max_size, on_record=lambda record: write_line(dump(record)))
+    flush()
+
+def parse_size(value):
+    """Parses a size in bytes with an optional K, M, G or T suffix (powers of 1024), e.g. '10M'."""
+    value = value.strip().upper().rstrip('B')
+    multiplier = 1
+    if value and value[-1] in SIZE_SUFFIXES:
+        multiplier = SIZE_SUFFIXES[value[-1]]
+        value = value[:-1]
+    try:
+        return int(float(value) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: '{value}'")
 
 def main():
     # Set up argument parser
@@ -63,10 +389,28 @@ def main():
         description="Recursively scan directories and output the file structure to the console, respecting .gitignore rules."
     )
     parser.add_argument("path", help="Path of the directory to scan")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Number of threads listing directories concurrently, useful on network filesystems (default: 1)")
+    parser.add_argument("--snapshot",
+                        help="Snapshot file: directories whose mtime is unchanged since the last run are not listed again")
+    parser.add_argument("--diff", action="store_true",
+                        help="Print what was added or removed since the last snapshot instead of the tree (needs --snapshot)")
+    parser.add_argument("--format", choices=["tree", "jsonl", "json"], default="tree",
+                        help="Output a tree of names (default), JSON Lines with sizes and counts, or a nested JSON tree")
+    parser.add_argument("--max_depth", type=int, help="Deepest level to output with --format jsonl/json (root is 0)")
+    parser.add_argument("--top", type=int, help="Only output the N largest entries, largest first (--format jsonl/json)")
+    parser.add_argument("--min_size", type=parse_size, default=0,
+                        help="Only output entries of at least this size, e.g. 10M (--format jsonl/json)")
+    parser.add_argument("--max_size", type=parse_size,
+                        help="Only output entries of at most this size, e.g. 1G (--format jsonl/json)")
     args = parser.parse_args()
+    if args.diff and not args.snapshot:
+        parser.error("--diff requires --snapshot")
+    size_options = args.max_depth is not None or args.top or args.min_size or args.max_size is not None
+    if args.format == "tree" and size_options:
+        parser.error("--max_depth, --top, --min_size and --max_size require --format jsonl or json")
 
     # Normalize the provided path
-    global root_path
     root_path = os.path.abspath(args.path)
 
     # Validate the provided path
@@ -78,13 +422,35 @@ def main():
         print(f"Error: The path '{root_path}' is not a directory.")
         sys.exit(1)
 
-    # Load .gitignore specifications if present
-    spec = load_gitignore(root_path)
+    # With a snapshot, reuse the listings of the previous run
+    lister = list_directory
+    if args.snapshot:
+        previous = load_snapshot(args.snapshot, root_path)
+        current = {'root': root_path, 'scanned_at_ns': time.time_ns(), 'directories': {}}
+        lister = snapshot_lister(previous, current['directories'])
+
+    if args.diff:
+        scan_directory(root_path, jobs=args.jobs, lister=lister, emit=lambda line: None)
+    elif args.format == "tree":
+        # Print the root directory
+        print(root_path)
+        # Start scanning from the root directory
+        scan_directory(root_path, jobs=args.jobs, lister=lister)
+    else:
+        write_sizes(root_path, args.format, args.jobs, lister, args.max_depth, args.top, args.min_size, args.max_size)
+
+    if args.snapshot:
+        save_snapshot(args.snapshot, current)
 
-    # Print the root directory
-    print(root_path)
-    # Start scanning from the root directory
-    scan_directory(root_path, "", spec)
+    if args.diff:
+        if previous is None:
+            print(f"No previous snapshot of '{root_path}' to compare with, snapshot saved to {args.snapshot}.")
+            return
+        changes = diff_snapshots(previous, current)
+        for sign, rel_path in changes:
+            print(f"{sign} {rel_path}")
+        added = sum(1 for sign, _ in changes if sign == '+')
+        print(f"{added} added, {len(changes) - added} removed since the last snapshot.")
 
 if __name__ == "__main__":
     main()
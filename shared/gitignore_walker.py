@@ -0,0 +1,126 @@
+"""
+gitignore_walker.py
+
+Fast, .gitignore-aware directory traversal shared by the scripts in this repository.
+Every directory is listed with a single os.scandir() call and the file type information cached
+in the returned DirEntry objects is reused instead of extra stat calls. Each .gitignore file found
+along the way is compiled once and applied to its own directory and everything below it, and
+ignored directories are pruned before they are ever listed.
+"""
+
+import os
+
+import pathspec
+
+# Names that are never listed, whatever the .gitignore files say.
+ALWAYS_SKIPPED = {'.git', '.gitignore'}
+
+def compile_gitignore(gitignore_path):
+    """
+    Reads a .gitignore file and returns its rules as a tuple of (compiled regex, include) pairs,
+    in file order. Returns None if the file has no rules or cannot be read.
+    """
+    try:
+        with open(gitignore_path, 'r', encoding='utf-8') as f:
+            spec = pathspec.PathSpec.from_lines('gitwildmatch', f)
+    except Exception as e:
+        print(f"Error reading .gitignore file {gitignore_path}: {e}")
+        return None
+    rules = tuple((pattern.regex, pattern.include) for pattern in spec.patterns if pattern.include is not None)
+    return rules or None
+
+def is_ignored(rules_chain, rel_path, is_dir):
+    """
+    Returns True if rel_path is ignored by the chain of .gitignore rules.
+
+    As in git, the last matching rule wins, rules of deeper .gitignore files come after those of
+    their parents, and each file's rules are matched against the path relative to its own directory.
+
+    Parameters:
+    - rules_chain (tuple): (base_rel_path, rules) pairs from the root downwards.
+    - rel_path (str): Path relative to the walk root, with '/' separators.
+    - is_dir (bool): Whether rel_path is a directory, so that patterns ending in '/' apply.
+    """
+    path = rel_path + '/' if is_dir else rel_path
+    ignored = False
+    for base, rules in rules_chain:
+        relative = path[len(base) + 1:] if base else path
+        for regex, include in rules:
+            if regex.match(relative) is not None:
+                ignored = include
+    return ignored
+
+def list_directory(path, rel_path='', rules_chain=()):
+    """
+    Lists one directory with os.scandir() and returns (entries, rules_chain).
+
+    entries are the DirEntry objects of the directory sorted by name, without .git, .gitignore and
+    anything ignored by the .gitignore rules in effect. The returned rules_chain adds the rules of
+    this directory's own .gitignore, and is the chain to pass when listing its subdirectories.
+    Raises OSError (e.g. PermissionError) if the directory cannot be listed.
+
+    Parameters:
+    - path (str): Path of the directory to list.
+    - rel_path (str): Path of the directory relative to the walk root ('' for the root itself).
+    - rules_chain (tuple): Rules in effect for the parent directory.
+    """
+    with os.scandir(path) as it:
+        entries = list(it)
+    return filter_entries(entries, path, rel_path, rules_chain)
+
+def filter_entries(entries, path, rel_path='', rules_chain=()):
+    """
+    Applies the .gitignore rules to an already listed directory and returns (entries, rules_chain)
+    like list_directory() does. entries only need the name attribute and the is_dir() method of
+    os.DirEntry, so cached listings can be filtered as well.
+    """
+    if any(entry.name == '.gitignore' for entry in entries):
+        rules = compile_gitignore(os.path.join(path, '.gitignore'))
+        if rules:
+            rules_chain = rules_chain + ((rel_path, rules),)
+
+    kept = []
+    for entry in entries:
+        if entry.name in ALWAYS_SKIPPED:
+            continue
+        if rules_chain:
+            entry_rel_path = f"{rel_path}/{entry.name}" if rel_path else entry.name
+            if is_ignored(rules_chain, entry_rel_path, entry.is_dir()):
+                continue
+        kept.append(entry)
+    kept.sort(key=lambda entry: entry.name)
+    return kept, rules_chain
+
+def is_walkable_dir(entry):
+    """Returns True if entry is a directory to descend into. Symlinks are not followed, to avoid cycles."""
+    return entry.is_dir() and not entry.is_symlink()
+
+def walk(root, onerror=None):
+    """
+    Iteratively walks the tree below root and yields (dir_path, rel_path, entries) for every directory
+    that is not ignored, parents before their children and siblings in name order.
+
+    entries is the list returned by list_directory(). Directories that cannot be listed are skipped;
+    the OSError is passed to onerror if given.
+    """
+    stack = [(root, '', ())]
+    while stack:
+        dir_path, rel_path, rules_chain = stack.pop()
+        try:
+            entries, rules_chain = list_directory(dir_path, rel_path, rules_chain)
+        except OSError as e:
+            if onerror is not None:
+                onerror(e)
+            continue
+        yield dir_path, rel_path, entries
+        for entry in reversed(entries):
+            if is_walkable_dir(entry):
+                child_rel_path = f"{rel_path}/{entry.name}" if rel_path else entry.name
+                stack.append((entry.path, child_rel_path, rules_chain))
+
+def iter_files(root, onerror=None):
+    """Yields the path of every file below root that is not ignored."""
+    for _, _, entries in walk(root, onerror):
+        for entry in entries:
+            if not entry.is_dir():
+                yield entry.path
@@ -1,52 +1,441 @@
 import argparse
 import subprocess
+import threading
+import datetime
+import platform
+import queue
+import json
+import time
+import sys
 import os
+import re
 
-def run_command(command):
+try:
+    import yaml
+except ImportError:
+    yaml = None  # YAML graph files need PyYAML, JSON graph files work without it
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Not available on Windows, peak RSS is then not reported
+
+# Failure policies: "continue" runs every command that does not depend on a failed one,
+# "stop" starts no new commands after a failure.
+FAILURE_POLICIES = ["continue", "stop"]
+# Each run writes its logs and report to a timestamped folder in the log directory.
+DEFAULT_LOG_DIR = "rbs_logs"
+DEFAULT_LOG_MAX_MB = 10
+DEFAULT_LOG_BACKUPS = 3
+# Bytes read from a command's output pipe at a time.
+READ_SIZE = 65536
+# Seconds to wait for the rest of a command's output after it exits. Output of background
+# processes it started, which keep the pipe open, is still logged while rbs runs.
+READER_TIMEOUT = 5
+
+def run_command(command, stdout=None, stderr=None):
     """
-    Run a command in a new console window.
-    The command is executed with the current working directory.
+    Run a command with cmd.exe on Windows, or in /bin/sh on other systems.
+    The command is executed with the current working directory, with its output going to stdout and stderr.
+    On Windows it gets a new console window unless its output is captured, which would leave the window empty.
     """
     # Use current working directory (from which the user invoked the command)
     current_dir = os.getcwd().rstrip("\\")
-    return subprocess.Popen(
-        ["cmd.exe", "/c", command],
-        cwd=current_dir,
-        creationflags=subprocess.CREATE_NEW_CONSOLE
-    )
+    if os.name == "nt":
+        captured = stdout is not None or stderr is not None
+        return subprocess.Popen(
+            ["cmd.exe", "/c", command],
+            cwd=current_dir,
+            stdout=stdout,
+            stderr=stderr,
+            creationflags=subprocess.CREATE_NO_WINDOW if captured else subprocess.CREATE_NEW_CONSOLE
+        )
+    return subprocess.Popen(["/bin/sh", "-c", command], cwd=current_dir, stdout=stdout, stderr=stderr)
+
+class RotatingLog:
+    """
+    Log file that is renamed to <path>.1, shifting older backups up to <path>.<backups>,
+    when a write would take it over max_bytes.
+    """
+
+    def __init__(self, path, max_bytes, backups):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.file = open(path, "wb")
+        self.size = 0
+
+    def write(self, data):
+        if self.size and self.size + len(data) > self.max_bytes:
+            self.rotate()
+        self.file.write(data)
+        self.file.flush()
+        self.size += len(data)
+
+    def rotate(self):
+        self.file.close()
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        self.file = open(self.path, "wb")
+        self.size = 0
+
+    def close(self):
+        self.file.close()
+
+def copy_stream(stream, log):
+    """
+    Copy everything a command writes to a pipe into a log as it arrives, so the command never
+    blocks on a full pipe buffer.
+    """
+    try:
+        for chunk in iter(lambda: stream.read1(READ_SIZE), b""):
+            log.write(chunk)
+    finally:
+        stream.close()
+        log.close()
+
+def wait_with_usage(process):
+    """
+    Wait for a process and return its exit code and resource usage (None on Windows).
+    """
+    if not hasattr(os, "wait4"):
+        return process.wait(), None
+    # wait4 reports the usage of this command alone, unlike getrusage(RUSAGE_CHILDREN)
+    _, wait_status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(wait_status)
+    return process.returncode, usage
+
+def peak_rss_mb(maxrss):
+    """
+    Returns a peak resident set size from ru_maxrss in MiB.
+    """
+    # ru_maxrss is in bytes on macOS and in KiB everywhere else
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+def own_peak_rss():
+    """
+    Returns the ru_maxrss of rbs itself, or None on Windows.
+
+    A command's ru_maxrss starts at this value: the kernel counts the memory the command was
+    started as a copy of, so a command using less than rbs reports rbs's peak instead of its own.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+
+def log_name(name):
+    """
+    Returns a task name made safe for use in a file name.
+    """
+    return re.sub(r"[^\w.-]", "_", name)
+
+def shutdown():
+    """
+    Shut down the computer.
+    """
+    if os.name == "nt":
+        subprocess.call(["shutdown", "/s", "/t", "0"])
+    else:
+        subprocess.call(["shutdown", "-h", "now"])
+
+def load_graph(graph_file):
+    """
+    Load a command graph from a JSON or YAML file and return it as {name: (command, dependencies)}.
+
+    The file holds a "tasks" mapping from task name to either a command string or a mapping with
+    "command" and an optional "depends_on" list of task names, for example:
+
+        tasks:
+          build: make -j8
+          render:
+            command: python render.py
+            depends_on: [build]
+
+    Raises ValueError if the file is malformed.
+    """
+    with open(graph_file, "r", encoding="utf-8") as f:
+        if graph_file.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise ValueError("PyYAML is required for YAML graph files (pip install pyyaml)")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    if not isinstance(data, dict) or not isinstance(data.get("tasks"), dict):
+        raise ValueError(f"{graph_file} must contain a 'tasks' mapping")
+
+    graph = {}
+    for name, task in data["tasks"].items():
+        if isinstance(task, str):
+            task = {"command": task}
+        if not isinstance(task, dict) or not isinstance(task.get("command"), str):
+            raise ValueError(f"Task '{name}' needs a command")
+        depends_on = task.get("depends_on", [])
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+        graph[str(name)] = (task["command"], [str(dependency) for dependency in depends_on])
+    check_graph(graph)
+    return graph
+
+def commands_graph(commands):
+    """
+    Build the command graph of commands given on the command line, which do not depend on each other.
+    They are started in the order given, so running them one at a time runs them sequentially.
+    """
+    return {f"command{index}": (command, []) for index, command in enumerate(commands, start=1)}
+
+def check_graph(graph):
+    """
+    Raises ValueError if a task depends on an unknown task or the dependencies form a cycle.
+    """
+    for name, (_, depends_on) in graph.items():
+        for dependency in depends_on:
+            if dependency not in graph:
+                raise ValueError(f"Task '{name}' depends on unknown task '{dependency}'")
+
+    # Repeatedly remove tasks whose dependencies are all removed; whatever is left is in a cycle
+    remaining = dict(graph)
+    while remaining:
+        ready = [name for name, (_, depends_on) in remaining.items() if not any(d in remaining for d in depends_on)]
+        if not ready:
+            raise ValueError(f"Dependency cycle between tasks: {', '.join(remaining)}")
+        for name in ready:
+            del remaining[name]
+
+def run_graph(graph, log_dir, max_parallel=None, on_failure="continue",
+              log_max_bytes=DEFAULT_LOG_MAX_MB * 1024 * 1024, log_backups=DEFAULT_LOG_BACKUPS):
+    """
+    Run the commands of a graph, starting each one as soon as its dependencies have succeeded,
+    with at most max_parallel commands running at once (None for no limit).
+    Commands depending on a failed command are skipped. With on_failure "stop", no new commands
+    are started after a failure, and the running ones are left to finish.
+    The stdout and stderr of each command are written to <name>.stdout.log and <name>.stderr.log
+    in log_dir, rotated at log_max_bytes with log_backups old files kept.
+    Returns {name: record} with the status, exit code, timings and peak RSS of each command.
+    """
+    dependents = {name: [] for name in graph}
+    waiting = {}  # name -> number of dependencies that have not succeeded yet
+    for name, (_, depends_on) in graph.items():
+        waiting[name] = len(depends_on)
+        for dependency in depends_on:
+            dependents[dependency].append(name)
+    ready = [name for name, count in waiting.items() if count == 0]  # in file order
+    records = {
+        name: {
+            "command": command,
+            "depends_on": depends_on,
+            "status": "skipped",
+            "exit_code": None,
+            "started_s": None,  # seconds after the start of the run
+            "wall_s": None,
+            "cpu_user_s": None,  # CPU time and peak RSS are not available on Windows
+            "cpu_system_s": None,
+            "peak_rss_mb": None,
+            "peak_rss_floor_mb": None,  # rbs's own peak RSS when the command started, see own_peak_rss()
+            "peak_rss_at_floor": None,  # True if the command's own peak is unknown, only below the floor
+            "stdout_log": None,
+            "stderr_log": None,
+        }
+        for name, (command, depends_on) in graph.items()
+    }
+    rss_floors = {}  # name -> own_peak_rss() when the command was started
+    finished = queue.Queue()
+    running = 0
+    failed = False
+    run_started = time.perf_counter()
+
+    def wait_for(name, process, readers, started):
+        returncode, usage = wait_with_usage(process)
+        wall_time = time.perf_counter() - started
+        for reader in readers:
+            reader.join(READER_TIMEOUT)
+        finished.put((name, returncode, wall_time, usage))
+
+    while ready or running:
+        # Start ready commands up to the limit, unless a failure stopped the run
+        while ready and not (failed and on_failure == "stop") and (max_parallel is None or running < max_parallel):
+            name = ready.pop(0)
+            record = records[name]
+            print(f"[{name}] Starting: {record['command']}")
+            record["stdout_log"] = os.path.join(log_dir, f"{log_name(name)}.stdout.log")
+            record["stderr_log"] = os.path.join(log_dir, f"{log_name(name)}.stderr.log")
+            logs = []
+            try:
+                logs = [RotatingLog(record[key], log_max_bytes, log_backups) for key in ("stdout_log", "stderr_log")]
+                started = time.perf_counter()
+                rss_floors[name] = own_peak_rss()
+                process = run_command(record["command"], subprocess.PIPE, subprocess.PIPE)
+            except OSError as e:
+                print(f"[{name}] Error starting command: {e}")
+                for log in logs:
+                    log.close()
+                record["status"] = "failed"
+                failed = True
+                continue
+            record["started_s"] = round(started - run_started, 3)
+            readers = [
+                threading.Thread(target=copy_stream, args=(stream, log), daemon=True)
+                for stream, log in zip((process.stdout, process.stderr), logs)
+            ]
+            for reader in readers:
+                reader.start()
+            threading.Thread(target=wait_for, args=(name, process, readers, started), daemon=True).start()
+            running += 1
+        if not running:
+            break
+
+        # Wait for any running command to finish
+        name, returncode, wall_time, usage = finished.get()
+        running -= 1
+        record = records[name]
+        record["exit_code"] = returncode
+        record["wall_s"] = round(wall_time, 3)
+        timing = f"{wall_time:.1f} s"
+        if usage is not None:
+            record["cpu_user_s"] = round(usage.ru_utime, 3)
+            record["cpu_system_s"] = round(usage.ru_stime, 3)
+            record["peak_rss_mb"] = round(peak_rss_mb(usage.ru_maxrss), 1)
+            timing += f", {usage.ru_utime + usage.ru_stime:.1f} s CPU, "
+            floor = rss_floors[name]
+            if floor is not None:
+                record["peak_rss_floor_mb"] = round(peak_rss_mb(floor), 1)
+                record["peak_rss_at_floor"] = usage.ru_maxrss <= floor
+            if record["peak_rss_at_floor"]:
+                timing += f"peak RSS at most {record['peak_rss_floor_mb']} MB (rbs's own)"
+            else:
+                timing += f"{record['peak_rss_mb']} MB peak RSS"
+        if returncode == 0:
+            record["status"] = "succeeded"
+            print(f"[{name}] Finished in {timing}")
+            for dependent in dependents[name]:
+                waiting[dependent] -= 1
+                if waiting[dependent] == 0:
+                    ready.append(dependent)
+        else:
+            record["status"] = "failed"
+            print(f"[{name}] Failed with exit code {returncode} after {timing}, see {record['stderr_log']}")
+            failed = True
+
+    for name, record in records.items():
+        if record["status"] == "skipped":
+            print(f"[{name}] Skipped")
+    return records
+
+def write_report(report_file, records, started, wall_time, args):
+    """
+    Writes the records of a run, with its settings and totals, to a JSON file.
+    """
+    report = {
+        "started": started.isoformat(timespec="seconds"),
+        "wall_time_s": round(wall_time, 3),
+        "platform": platform.platform(),
+        "max_parallel": args.max_parallel,
+        "on_failure": args.on_failure,
+        "shutdown": not args.no_shutdown,
+        "summary": {
+            status: sum(record["status"] == status for record in records.values())
+            for status in ("succeeded", "failed", "skipped")
+        },
+        "tasks": records,
+    }
+    with open(report_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
 
 def main():
     parser = argparse.ArgumentParser(
-        description="Run one or more commands in new command prompt windows, then shut down the computer."
+        description="Run one or more commands, or a graph of commands with dependencies, then shut down the computer."
     )
     parser.add_argument(
         "--parallel", action="store_true",
         help="Run all commands concurrently (by default they run sequentially)."
     )
     parser.add_argument(
-        "commands", nargs="+",
+        "--graph",
+        help="JSON or YAML file of commands with dependencies, run instead of the command arguments."
+    )
+    parser.add_argument(
+        "--max_parallel", type=int,
+        help="Maximum number of commands running at once (default: 1 for commands, or no limit "
+             "with --parallel or --graph)."
+    )
+    parser.add_argument(
+        "--on_failure", choices=FAILURE_POLICIES, default="continue",
+        help="After a failed command, stop starting new commands or continue with those that do not "
+             "depend on it (default: continue)."
+    )
+    parser.add_argument(
+        "--no_shutdown", action="store_true",
+        help="Do not shut down the computer when the commands have finished, e.g. to try out a batch."
+    )
+    parser.add_argument(
+        "--log_dir", default=DEFAULT_LOG_DIR,
+        help=f"Folder for the output logs and run report of each run (default: {DEFAULT_LOG_DIR})."
+    )
+    parser.add_argument(
+        "--log_max_mb", type=float, default=DEFAULT_LOG_MAX_MB,
+        help=f"Size in MiB at which a command's log file is rotated (default: {DEFAULT_LOG_MAX_MB})."
+    )
+    parser.add_argument(
+        "--log_backups", type=int, default=DEFAULT_LOG_BACKUPS,
+        help=f"Number of rotated log files kept per command and stream (default: {DEFAULT_LOG_BACKUPS})."
+    )
+    parser.add_argument(
+        "commands", nargs="*",
         help="The command(s) to execute. (If a command has spaces, enclose it in quotes.)"
     )
     args = parser.parse_args()
+    if args.graph and args.commands:
+        parser.error("give either --graph or commands, not both")
+    if not args.graph and not args.commands:
+        parser.error("give one or more commands or a --graph file")
+    if args.max_parallel is not None and args.max_parallel < 1:
+        parser.error("--max_parallel must be at least 1")
 
-    processes = []
-
-    if args.parallel:
-        # Start all commands concurrently.
-        for cmd in args.commands:
-            p = run_command(cmd)
-            processes.append(p)
-        # Wait for all commands to finish.
-        for p in processes:
-            p.wait()
+    if args.graph:
+        try:
+            graph = load_graph(args.graph)
+        except (OSError, ValueError) as e:
+            # Nothing has run yet, so do not shut down over a typo in the graph file
+            print(f"Error reading graph file {args.graph}: {e}")
+            sys.exit(1)
     else:
-        # Run commands one after the other.
-        for cmd in args.commands:
-            p = run_command(cmd)
-            p.wait()
+        graph = commands_graph(args.commands)
+    max_parallel = args.max_parallel
+    if max_parallel is None and not (args.parallel or args.graph):
+        max_parallel = 1
+
+    args.max_parallel = max_parallel
+
+    started = datetime.datetime.now()
+    run_dir = os.path.join(args.log_dir, f"run_{started:%Y%m%d_%H%M%S}")
+    try:
+        os.makedirs(run_dir, exist_ok=True)
+    except OSError as e:
+        print(f"Error creating log folder {run_dir}: {e}")
+        sys.exit(1)
+    print(f"Logs: {run_dir}")
+
+    start = time.perf_counter()
+    records = run_graph(graph, run_dir, max_parallel, args.on_failure,
+                        int(args.log_max_mb * 1024 * 1024), args.log_backups)
+    wall_time = time.perf_counter() - start
+    statuses = [record["status"] for record in records.values()]
+    print(f"{statuses.count('succeeded')} succeeded, {statuses.count('failed')} failed, "
+          f"{statuses.count('skipped')} skipped in {wall_time:.1f} s")
+
+    # Write the report before the shutdown, so the morning after shows what ran and how long it took
+    report_file = os.path.join(run_dir, "report.json")
+    try:
+        write_report(report_file, records, started, wall_time, args)
+        print(f"Report written to {report_file}")
+    except OSError as e:
+        print(f"Error writing report {report_file}: {e}")
 
     # Once all commands have finished, shut down the computer.
-    subprocess.call(["shutdown", "/s", "/t", "0"])
+    if args.no_shutdown:
+        print("Not shutting down (--no_shutdown)")
+    else:
+        shutdown()
 
 if __name__ == "__main__":
     main()